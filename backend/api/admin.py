@@ -33,6 +33,7 @@ class RecipeAdmin(BaseAdmin):
         'author',
         'cooking_time',
         'created_at',
+        'favorites_count',
     )
     list_display_links = ('author', )
     search_fields = ('name', 'author__username')
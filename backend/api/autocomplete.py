@@ -0,0 +1,44 @@
+"""Префиксный индекс ингредиентов для автодополнения.
+
+Индекс — отсортированный по названию в нижнем регистре список, поиск по
+префиксу сводится к двум бинарным поискам. Он строится при первом
+обращении и перестраивается, когда сигналы Ingredients меняют версию
+справочника в кеше. Другие процессы, в том числе load_ingredients,
+видят новую версию, только если кеш у них общий (CACHE_BACKEND);
+LocMemCache у каждого процесса свой.
+"""
+from bisect import bisect_left
+
+from .cache import get_data_version
+from .models import Ingredients
+
+MAX_CHAR = chr(0x10FFFF)
+
+_index = None
+
+
+class IngredientIndex:
+
+    def __init__(self, version, rows):
+        self.version = version
+        rows = sorted(rows, key=lambda row: (row['name'].casefold(),
+                                             row['id']))
+        self.keys = [row['name'].casefold() for row in rows]
+        self.rows = rows
+
+    def search(self, prefix, limit):
+        """Ингредиенты с названием на prefix, точные совпадения первыми."""
+        prefix = prefix.casefold()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + MAX_CHAR, lo=start)
+        return self.rows[start:min(end, start + limit)]
+
+
+def get_index():
+    global _index
+    version = get_data_version('ingredients')
+    if _index is None or _index.version != version:
+        _index = IngredientIndex(version, Ingredients.objects.values(
+            'id', 'name', 'measurement_unit'
+        ))
+    return _index
@@ -0,0 +1,82 @@
+"""Массовое добавление рецептов в избранное и список покупок.
+
+Сырые INSERT и DELETE не отправляют сигналов, поэтому счётчики
+рецептов и материализованный список покупок обновляются, а множества
+в кеше сбрасываются здесь явно, по одному запросу на всю пачку.
+"""
+from django.db import connection, transaction
+
+from .membership import invalidate_membership
+from .models import Recipe, ShoppingCart
+from .shopping_list import change_recipes, lock_recipes
+from .signals import change_counter
+from .user_recipes import TRACKED
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+
+
+def _changed(model, user_id, recipe_ids, added):
+    if not recipe_ids:
+        return
+    counter = TRACKED[model]
+    if model is ShoppingCart:
+        change_recipes(user_id, recipe_ids, 1 if added else -1)
+    change_counter(Recipe.objects.filter(id__in=recipe_ids), counter,
+                   1 if added else -1)
+    invalidate_membership(user_id)
+
+
+def _results(recipe_ids, found, done, done_status, other_status):
+    return [
+        {'id': recipe_id,
+         'status': (NOT_FOUND if recipe_id not in found
+                    else done_status if recipe_id in done
+                    else other_status)}
+        for recipe_id in recipe_ids
+    ]
+
+
+def _existing_recipes(model, recipe_ids):
+    if model is ShoppingCart:
+        return set(lock_recipes(recipe_ids))
+    return set(Recipe.objects.filter(id__in=recipe_ids).values_list(
+        'id', flat=True
+    ))
+
+
+def add_recipes(model, user_id, recipe_ids):
+    """Добавляет рецепты; результат — статус для каждого id."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        found = _existing_recipes(model, recipe_ids)
+        # Добавленными считаются только строки, которые вставил именно
+        # этот запрос: параллельная вставка тех же рецептов их не вернёт.
+        cursor.execute(
+            f'INSERT INTO {model._meta.db_table} (user_id, recipe_id) '
+            f'SELECT %s, id FROM {Recipe._meta.db_table} '
+            f'WHERE id = ANY(%s) '
+            f'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+            f'RETURNING recipe_id',
+            [user_id, list(found)]
+        )
+        added = [row[0] for row in cursor.fetchall()]
+        _changed(model, user_id, added, True)
+    return _results(recipe_ids, found, set(added), ADDED, EXISTS)
+
+
+def remove_recipes(model, user_id, recipe_ids):
+    """Убирает рецепты; результат — статус для каждого id."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        found = _existing_recipes(model, recipe_ids)
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} '
+            f'WHERE user_id = %s AND recipe_id = ANY(%s) '
+            f'RETURNING recipe_id',
+            [user_id, list(found)]
+        )
+        removed = [row[0] for row in cursor.fetchall()]
+        _changed(model, user_id, removed, False)
+    return _results(recipe_ids, found, set(removed), REMOVED, MISSING)
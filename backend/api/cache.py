@@ -0,0 +1,182 @@
+"""Кеш ответов API с рецептами.
+
+Страница хранится в общем для всех пользователей виде, а флаги
+конкретного пользователя накладываются при выдаче из api.membership.
+Вместе со страницей хранятся поколения рецептов, которые в неё попали;
+при чтении они сверяются с текущими, и страница с изменившимся рецептом
+считается промахом. Сигналы из api.signals после фиксации транзакции
+меняют поколения затронутых рецептов, а при изменении состава списков —
+и поколение списков, которое входит в их ключ. Поколения — случайные
+токены, поэтому вытеснение ключа из кеша не вернёт старое значение.
+"""
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .membership import get_membership, overlay
+from .models import Tags
+
+LIST_KEY = 'recipes:list:{}'
+DETAIL_KEY = 'recipes:detail:{}'
+GENERATION_KEY = 'recipes:generation:{}'
+# Меняется при любом изменении рецептов: страница, во время построения
+# которой оно случилось, не кешируется.
+ANY_RECIPE = GENERATION_KEY.format('any')
+ALL_LISTS = GENERATION_KEY.format('lists')
+STATS_KEY = 'recipes:stats:{}'
+STATS_EVENTS = ('hit', 'miss')
+PERSONAL_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+TAG_IDS_KEY = 'tags:ids'
+DATA_VERSION_KEY = '{}:version'
+
+
+def _generations(keys):
+    """Текущие поколения по ключам; недостающие заводятся заново."""
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    for key in missing:
+        cache.add(key, uuid4().hex, timeout=None)
+    if missing:
+        generations.update(cache.get_many(missing))
+    return generations
+
+
+def list_key(request):
+    """Ключ страницы списка: хост, путь, строка запроса и поколение."""
+    uri = request.build_absolute_uri()
+    generation = _generations([ALL_LISTS]).get(ALL_LISTS)
+    return LIST_KEY.format(md5(f'{uri} {generation}'.encode()).hexdigest())
+
+
+def detail_key(request, pk):
+    return DETAIL_KEY.format(f'{request.get_host()}:{pk}')
+
+
+def _count(event):
+    key = STATS_KEY.format(event)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_stats():
+    """Счётчики попаданий и промахов кеша, их показывает cache_stats."""
+    return {
+        event: cache.get(STATS_KEY.format(event), 0)
+        for event in STATS_EVENTS
+    }
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format(event) for event in STATS_EVENTS])
+
+
+def _rows(data, many):
+    if not many:
+        return [data]
+    if isinstance(data, dict):
+        return data.get('results', [])
+    return data
+
+
+def _get(key):
+    """Данные из кеша, если ни один их рецепт с тех пор не менялся."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    generations, data = entry
+    if cache.get_many(list(generations)) != generations:
+        return None
+    return data
+
+
+def _store(key, data, many, started):
+    keys = [ANY_RECIPE] + [
+        GENERATION_KEY.format(row['id']) for row in _rows(data, many)
+    ]
+    generations = _generations(keys)
+    if generations.pop(ANY_RECIPE, None) != started:
+        # Пока страница строилась, рецепты менялись: она могла
+        # прочитать старые данные.
+        return
+    cache.set(key, (generations, data), settings.RECIPE_CACHE_TIMEOUT)
+
+
+def cached_response(request, key, build, many=True):
+    """Отдаёт ответ из кеша или строит его через build и сохраняет.
+
+    Выборки по избранному и списку покупок у каждого пользователя свои,
+    поэтому они не кешируются.
+    """
+    if any(name in request.query_params for name in PERSONAL_FILTERS):
+        return build()
+    data = _get(key)
+    if data is not None:
+        _count('hit')
+        overlay(_rows(data, many), get_membership(request.user))
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+    _count('miss')
+    started = _generations([ANY_RECIPE]).get(ANY_RECIPE)
+    response = build()
+    if response.status_code == 200:
+        _store(key, response.data, many, started)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def invalidate_recipes(recipe_ids, all_lists=False):
+    """Устаревают закешированные рецепты и страницы, где они встречаются.
+
+    all_lists нужен, когда изменение может сдвинуть состав любой страницы:
+    появление или удаление рецепта, смена тегов. Срабатывает после
+    фиксации транзакции, иначе параллельный запрос успел бы закешировать
+    ещё не изменённые данные.
+    """
+    keys = [ANY_RECIPE] + [GENERATION_KEY.format(pk) for pk in recipe_ids]
+    if all_lists:
+        keys.append(ALL_LISTS)
+    transaction.on_commit(lambda: cache.set_many(
+        {key: uuid4().hex for key in keys}, timeout=None
+    ))
+
+
+def get_tag_ids():
+    """Словарь slug -> id всех тегов."""
+    tag_ids = cache.get(TAG_IDS_KEY)
+    if tag_ids is None:
+        tag_ids = dict(Tags.objects.values_list('slug', 'id'))
+        cache.set(TAG_IDS_KEY, tag_ids, timeout=None)
+    return tag_ids
+
+
+def invalidate_tags():
+    transaction.on_commit(lambda: cache.delete(TAG_IDS_KEY))
+
+
+def get_data_version(name):
+    """Версия справочника, общая для всех процессов с общим кешем.
+
+    Версия — случайный токен, а не счётчик: после вытеснения ключа или
+    очистки кеша появится новое значение, а не одно из уже виденных.
+    """
+    key = DATA_VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(name):
+    """Меняет версию справочника после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: cache.set(
+        DATA_VERSION_KEY.format(name), uuid4().hex, timeout=None
+    ))
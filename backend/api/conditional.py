@@ -0,0 +1,57 @@
+"""Условные GET-запросы: ETag и Last-Modified без сериализации.
+
+Версия выборки — это максимальный updated_at и число строк после
+фильтрации, поэтому её проверка стоит одного агрегирующего запроса.
+Last-Modified отдаётся только для одного объекта: удаление строки из
+списка не сдвигает максимальный updated_at, а число строк в ETag есть.
+"""
+from hashlib import md5
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+
+
+def get_version(queryset):
+    return queryset.order_by().aggregate(
+        last_modified=Max('updated_at'), count=Count('pk')
+    )
+
+
+def get_object_version(queryset, pk):
+    try:
+        return get_version(queryset.filter(pk=pk))
+    except (TypeError, ValueError, ValidationError):
+        return {'last_modified': None, 'count': 0}
+
+
+def conditional_response(request, version, build, personal=None,
+                         single=False):
+    """Отвечает 304, если клиент уже получил эту версию, иначе build().
+
+    personal — данные пользователя, от которых зависит ответ. Они входят
+    в ETag, а Last-Modified для такого ответа не отдаётся. Для списков
+    (single=False) Last-Modified тоже не отдаётся.
+    """
+    last_modified = version['last_modified']
+    etag = quote_etag(md5(repr((
+        request.build_absolute_uri(), version['count'], last_modified,
+        personal
+    )).encode()).hexdigest())
+    timestamp = None
+    if single and personal is None and last_modified is not None:
+        timestamp = int(last_modified.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp
+    )
+    if response is None:
+        response = build()
+        if response.status_code != 200:
+            return response
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -0,0 +1,158 @@
+"""Потоковая выгрузка списка покупок в txt, csv и pdf.
+
+Каждый формат — генератор, который получает строки (название, единица,
+количество) по одной и сразу отдаёт байты, поэтому память не зависит от
+длины списка.
+"""
+import csv
+
+from django.http import StreamingHttpResponse
+from rest_framework.negotiation import DefaultContentNegotiation
+
+TITLE = 'Список покупок'
+FILENAME = 'shopping-list'
+
+PDF_FONT_SIZE = 11
+PDF_LEADING = 16
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 50
+PDF_LINES_PER_PAGE = (PDF_PAGE_HEIGHT - 2 * PDF_MARGIN) // PDF_LEADING
+
+
+class ExportNegotiation(DefaultContentNegotiation):
+    """Не связывает параметр format с рендерерами DRF.
+
+    Формат файла выбирает сама выгрузка, а ошибки отдаются первым
+    рендерером из настроек.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def format_line(name, unit, amount):
+    return f'{name} ({unit}) - {amount}'
+
+
+def export_txt(rows):
+    for name, unit, amount in rows:
+        yield (format_line(name, unit, amount) + '\n').encode()
+
+
+class Echo:
+    """Файлоподобный объект, который возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield '\ufeff'.encode()
+    yield writer.writerow(('Ингредиент', 'Единица измерения',
+                           'Количество')).encode()
+    for row in rows:
+        yield writer.writerow(row).encode()
+
+
+def _cyrillic_differences():
+    """Имена глифов кириллицы для кодов cp1251 0xC0-0xFF, 0xA8, 0xB8."""
+    names = [
+        f'/afii{first + offset + (offset >= 6)}'
+        for first in (10017, 10065)
+        for offset in range(32)
+    ]
+    return f'168 /afii10023 184 /afii10071 192 {" ".join(names)}'
+
+
+def _pdf_text(line):
+    text = line.encode('cp1251', errors='replace')
+    return (text.replace(b'\\', b'\\\\').replace(b'(', b'\\(')
+            .replace(b')', b'\\)'))
+
+
+def _pdf_page(lines):
+    top = PDF_PAGE_HEIGHT - PDF_MARGIN
+    content = (f'BT /F1 {PDF_FONT_SIZE} Tf {PDF_LEADING} TL '
+               f'{PDF_MARGIN} {top} Td ').encode()
+    content += b''.join(b'(' + _pdf_text(line) + b') Tj T* '
+                        for line in lines)
+    return content + b'ET'
+
+
+def export_pdf(rows):
+    """PDF, который собирается постранично по мере чтения строк.
+
+    Шрифт — стандартный Helvetica с кодировкой cp1251, поэтому файл не
+    встраивает шрифт и может быть отдан до того, как прочитан весь список.
+    """
+    offsets = {}
+    position = 0
+    kids = []
+
+    def write(number, body):
+        nonlocal position
+        offsets[number] = position
+        chunk = f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+        position += len(chunk)
+        return chunk
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position = len(header)
+    yield header
+    yield write(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    yield write(3, (
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+        '/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+        f'/Differences [{_cyrillic_differences()}] >> >>'
+    ).encode())
+
+    def pages():
+        lines = [TITLE, '']
+        for row in rows:
+            lines.append(format_line(*row))
+            if len(lines) == PDF_LINES_PER_PAGE:
+                yield lines
+                lines = []
+        if lines:
+            yield lines
+
+    number = 4
+    for lines in pages():
+        content = _pdf_page(lines)
+        yield write(number, (
+            f'<< /Length {len(content)} >>\nstream\n'.encode()
+            + content + b'\nendstream'
+        ))
+        yield write(number + 1, (
+            f'<< /Type /Page /Parent 2 0 R /Contents {number} 0 R '
+            f'/MediaBox [0 0 {PDF_PAGE_WIDTH} {PDF_PAGE_HEIGHT}] '
+            '/Resources << /Font << /F1 3 0 R >> >> >>'
+        ).encode())
+        kids.append(f'{number + 1} 0 R')
+        number += 2
+    yield write(2, (
+        f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+    ).encode())
+    xref = [f'xref\n0 {number}\n', '0000000000 65535 f \n']
+    xref += [f'{offsets[obj]:010d} 00000 n \n' for obj in range(1, number)]
+    yield ''.join(xref).encode()
+    yield (f'trailer\n<< /Size {number} /Root 1 0 R >>\n'
+           f'startxref\n{position}\n%%EOF\n').encode()
+
+
+EXPORTS = {
+    'txt': ('text/plain; charset=utf-8', export_txt),
+    'csv': ('text/csv; charset=utf-8', export_csv),
+    'pdf': ('application/pdf', export_pdf),
+}
+
+
+def export_response(export_format, rows):
+    content_type, export = EXPORTS[export_format]
+    response = StreamingHttpResponse(export(rows), content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{FILENAME}.{export_format}"'
+    )
+    return response
@@ -0,0 +1,119 @@
+"""Поле картинки, которая приходит в JSON строкой data:image/...;base64.
+
+Строка декодируется кусками прямо в загружаемый файл: небольшой
+остаётся в памяти, больше FILE_UPLOAD_MAX_MEMORY_SIZE пишется во
+временный файл на диске, как у обычных загрузок Django. Размер после
+декодирования известен по длине строки и проверяется до начала работы,
+а число пикселей — по заголовку, как только Pillow сможет его прочитать.
+Пробелы и переводы строк, как в base64 по MIME, пропускаются.
+Полную проверку картинки выполняет ImageField, и для файла на диске она
+читает его с диска, а не из копии в памяти.
+"""
+import base64
+import binascii
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+DATA_URI_PREFIX = 'data:image'
+BASE64_MARKER = ';base64,'
+WHITESPACE = ' \t\r\n'
+STRIP_WHITESPACE = str.maketrans('', '', WHITESPACE)
+CHUNK_SIZE = 64 * 1024
+# Сколько первых кусков ждать заголовок, прежде чем дочитать всё.
+HEADER_CHUNKS = 4
+
+
+class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': 'Размер картинки не должен превышать {max_size} байт.',
+        'too_many_pixels': ('Картинка не должна быть больше {max_pixels} '
+                            'пикселей.'),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith(DATA_URI_PREFIX):
+            data = self.decode(data)
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        start = data.find(BASE64_MARKER)
+        if start == -1:
+            self.fail('invalid_image')
+        start += len(BASE64_MARKER)
+        end = len(data.rstrip(WHITESPACE))
+        encoded = end - start - sum(
+            data.count(char, start, end) for char in WHITESPACE
+        )
+        size = encoded // 4 * 3 - data.count('=', end - 2, end)
+        if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail('too_large', max_size=settings.IMAGE_UPLOAD_MAX_SIZE)
+        content_type = data[len('data:'):start - len(BASE64_MARKER)]
+        name = 'temp.' + content_type.split('/')[-1]
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            upload = TemporaryUploadedFile(name, content_type, size, None)
+        else:
+            upload = InMemoryUploadedFile(BytesIO(), None, name,
+                                          content_type, size, None)
+        header_checked = False
+        header_end = start + HEADER_CHUNKS * CHUNK_SIZE
+        rest = ''
+        for offset in range(start, end, CHUNK_SIZE):
+            chunk = rest + data[offset:offset + CHUNK_SIZE].translate(
+                STRIP_WHITESPACE
+            )
+            # Декодируется часть куска, кратная 4, остаток переходит в
+            # следующий; у последнего куска остатка быть не должно.
+            aligned = (len(chunk) if offset + CHUNK_SIZE >= end
+                       else len(chunk) - len(chunk) % 4)
+            rest = chunk[aligned:]
+            try:
+                upload.file.write(base64.b64decode(
+                    chunk[:aligned], validate=True
+                ))
+            except (binascii.Error, ValueError):
+                upload.close()
+                self.fail('invalid_image')
+            if not header_checked and offset < header_end:
+                header_checked = self.check_header(upload)
+        if not header_checked:
+            self.check_header(upload)
+        upload.size = upload.file.tell()
+        upload.file.seek(0)
+        return upload
+
+    def check_header(self, upload):
+        """Проверяет размеры по заголовку; False, если он ещё не дописан."""
+        position = upload.file.tell()
+        upload.file.seek(0)
+        try:
+            # Image.open читает только заголовок, пиксели не декодируются.
+            width, height = Image.open(upload.file).size
+        except Image.DecompressionBombError:
+            width = height = settings.IMAGE_UPLOAD_MAX_PIXELS
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            return False
+        finally:
+            upload.file.seek(position)
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            upload.close()
+            self.fail('too_many_pixels',
+                      max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS)
+        return True
+
+
+class ThumbnailField(serializers.ImageField):
+    """Миниатюра картинки, а пока её нет — сама картинка."""
+
+    def __init__(self, original, **kwargs):
+        self.original = original
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return (super().get_attribute(instance)
+                or getattr(instance, self.original))
@@ -0,0 +1,21 @@
+"""Преобразования картинок, которые выполняются в пуле процессов.
+
+Модуль не зависит от Django, чтобы рабочему процессу хватало Pillow.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+
+def render_webp(data, size, quality):
+    """Уменьшает картинку до size с сохранением пропорций, отдаёт WebP."""
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+        if image.mode not in ('RGB', 'RGBA'):
+            transparent = (image.mode in ('LA', 'PA')
+                           or 'transparency' in image.info)
+            image = image.convert('RGBA' if transparent else 'RGB')
+        output = BytesIO()
+        image.save(output, 'WEBP', quality=quality)
+    return output.getvalue()
@@ -0,0 +1,31 @@
+from api.cache import get_stats, reset_stats
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Показывает попадания и промахи кеша ответов с рецептами. '
+            'Счётчики лежат в самом кеше, поэтому команда видит счётчики '
+            'сервера только с общим CACHE_BACKEND, например '
+            'PyMemcacheCache: у LocMemCache они свои в каждом процессе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить счётчики после вывода.')
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            self.stderr.write(self.style.WARNING(
+                'CACHE_BACKEND — LocMemCache: счётчики этого процесса, '
+                'а не сервера.'
+            ))
+        stats = get_stats()
+        total = stats['hit'] + stats['miss']
+        ratio = stats['hit'] / total if total else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Попаданий: {stats["hit"]}, промахов: {stats["miss"]}, '
+            f'доля попаданий: {ratio:.1%}.'
+        ))
+        if options['reset']:
+            reset_stats()
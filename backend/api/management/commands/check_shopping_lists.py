@@ -0,0 +1,32 @@
+from api.shopping_list import find_mismatches, rebuild
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Сверяет материализованные списки покупок с живым агрегатом '
+            'по рецептам в корзинах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересобрать списки пользователей с расхождениями.'
+        )
+
+    def handle(self, *args, **options):
+        mismatches = find_mismatches()
+        for user_id, ingredient_id, expected, stored in mismatches:
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'ожидается {expected}, сохранено {stored}'
+            )
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        if options['fix']:
+            user_ids = {user_id for user_id, *_ in mismatches}
+            rebuild(user_ids)
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересобрано списков: {len(user_ids)}.'
+            ))
+        else:
+            raise CommandError(f'Найдено расхождений: {len(mismatches)}.')
@@ -0,0 +1,136 @@
+import re
+
+from api.models import (SEARCH_CONFIG, Favorite, IngredientsRecipe, Recipe,
+                        ShoppingCart, ShoppingListItem, TagsRecipe)
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from users.models import Follow
+
+User = get_user_model()
+
+SCANNED_INDEX = re.compile(r'Scan (?:Backward )?(?:using|on) (\S+)')
+
+
+class Command(BaseCommand):
+    help = ('Показывает планы горячих запросов api/views.py и проверяет, '
+            'что каждый читает свой индекс, а не всю таблицу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Завершиться с ошибкой, если запрос не использует индекс.'
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать планы целиком.'
+        )
+
+    def hot_queries(self):
+        """Запрос -> (queryset, модель, начальные столбцы нужного индекса)."""
+        user = User.objects.first() or User(id=0)
+        recipe = Recipe.objects.first() or Recipe(id=0)
+        return {
+            'лента рецептов': (Recipe.objects.for_read(user).order_by(
+                'created_at', 'id'
+            )[:10], Recipe, ['created_at', 'id']),
+            'курсорная страница': (Recipe.objects.filter(
+                created_at__gt=timezone.now()
+            ).order_by('created_at', 'id')[:10], Recipe, ['created_at', 'id']),
+            'полнотекстовый поиск': (Recipe.objects.filter(
+                search_vector=SearchQuery('рецепт', config=SEARCH_CONFIG)
+            ), Recipe, ['search_vector']),
+            'фильтр по автору': (Recipe.objects.filter(author=user),
+                                 Recipe, ['author_id']),
+            'фильтр is_favorited': (Recipe.objects.filter(
+                favorites__user=user
+            ), Favorite, ['user_id']),
+            'фильтр is_in_shopping_cart': (Recipe.objects.filter(
+                shopping_cart__user=user
+            ), ShoppingCart, ['user_id']),
+            'рецепты тега': (TagsRecipe.objects.filter(
+                tags_id=1
+            ).values('recipe_id'), TagsRecipe, ['tags_id']),
+            'страница подписок': (User.objects.filter(
+                following__user=user
+            )[:10], Follow, ['user_id']),
+            'рецепты подписок': (Recipe.objects.filter(
+                author__in=[user]
+            ).first_per_author(3), Recipe, ['author_id']),
+            'проверка избранного': (Favorite.objects.filter(
+                user=user, recipe=recipe
+            ), Favorite, ['user_id', 'recipe_id']),
+            'проверка списка покупок': (ShoppingCart.objects.filter(
+                user=user, recipe=recipe
+            ), ShoppingCart, ['user_id', 'recipe_id']),
+            'ингредиенты рецепта': (IngredientsRecipe.objects.filter(
+                recipe=recipe
+            ), IngredientsRecipe, ['recipe_id']),
+            'выгрузка списка покупок': (ShoppingListItem.objects.filter(
+                user=user
+            ).values_list('ingredient_id', 'total_amount'),
+                ShoppingListItem, ['user_id']),
+        }
+
+    @staticmethod
+    def index_names(cursor, model, columns):
+        """Индексы таблицы модели, которые начинаются со столбцов columns.
+
+        Имена индексов внешних ключей Django генерирует с хешем, поэтому
+        они ищутся по определению, а не задаются строкой.
+        """
+        cursor.execute(
+            """SELECT index_class.relname, ARRAY(
+                   SELECT attribute.attname
+                   FROM unnest(ix.indkey) WITH ORDINALITY AS key(num, pos)
+                   JOIN pg_attribute attribute
+                     ON attribute.attrelid = ix.indrelid
+                    AND attribute.attnum = key.num
+                   ORDER BY key.pos
+               )
+               FROM pg_index ix
+               JOIN pg_class index_class ON index_class.oid = ix.indexrelid
+               WHERE ix.indrelid = %s::regclass""",
+            [model._meta.db_table]
+        )
+        return {
+            name for name, index_columns in cursor.fetchall()
+            if index_columns[:len(columns)] == columns
+        }
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Команда работает только с PostgreSQL.')
+        failed = []
+        with connection.cursor() as cursor:
+            # На маленьких таблицах планировщик и так выбирает Seq Scan,
+            # поэтому проверяем, что индекс для запроса вообще есть и
+            # план читает именно его, а не, например, весь первичный ключ.
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                for title, (queryset, model, columns) in (
+                    self.hot_queries().items()
+                ):
+                    plan = queryset.explain()
+                    expected = self.index_names(cursor, model, columns)
+                    used = set(SCANNED_INDEX.findall(plan))
+                    target = f'{model._meta.db_table}({", ".join(columns)})'
+                    if used & expected:
+                        self.stdout.write(self.style.SUCCESS(
+                            f'{title}: индекс по {target}'
+                        ))
+                    else:
+                        failed.append(title)
+                        self.stdout.write(self.style.ERROR(
+                            f'{title}: не использует индекс по {target}'
+                        ))
+                    if options['verbose_plans'] or title in failed:
+                        self.stdout.write(plan)
+            finally:
+                cursor.execute('RESET enable_seqscan')
+        if failed and options['strict']:
+            raise CommandError(
+                'Запросы без индекса: ' + ', '.join(failed)
+            )
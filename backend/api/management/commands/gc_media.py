@@ -0,0 +1,158 @@
+import heapq
+import os
+import shutil
+import time
+from pathlib import Path
+
+from api.models import MediaFile
+from api.thumbnails import THUMBNAILS
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Collate
+
+# Порядок строк в базе должен совпадать с порядком строк в Python.
+BYTE_ORDER = 'C'
+
+
+def referenced_names(chunk_size):
+    """Все имена файлов из полей картинок, по возрастанию и без повторов.
+
+    Каждое поле читается своим серверным курсором, потоки сливаются.
+    """
+    streams = [
+        model.objects.exclude(**{field: ''}).exclude(
+            **{f'{field}__isnull': True}
+        ).order_by(Collate(field, BYTE_ORDER)).values_list(
+            field, flat=True
+        ).iterator(chunk_size=chunk_size)
+        for model, fields in THUMBNAILS.items()
+        for field in fields
+    ]
+    previous = None
+    for name in heapq.merge(*streams):
+        if name != previous:
+            yield name
+            previous = name
+
+
+def media_files(root, skip):
+    """Файлы под root как (относительный путь, stat) по возрастанию пути.
+
+    Каталог сортируется как «имя/», чтобы его содержимое шло там же, где
+    и при сравнении полных путей. В памяти только открытые каталоги.
+    """
+    def walk(directory, prefix):
+        with os.scandir(directory) as entries:
+            entries = sorted(
+                (entry.name + '/' if entry.is_dir(follow_symlinks=False)
+                 else entry.name, entry)
+                for entry in entries
+            )
+        for key, entry in entries:
+            if key.endswith('/'):
+                if os.path.abspath(entry.path) != skip:
+                    yield from walk(entry.path, prefix + key)
+            else:
+                yield prefix + key, entry.stat(follow_symlinks=False)
+    yield from walk(root, '')
+
+
+def orphans(files, names):
+    """Сортированное слияние: файлы, которых нет среди names."""
+    name = next(names, None)
+    for path, stat in files:
+        while name is not None and name < path:
+            name = next(names, None)
+        if name != path:
+            yield path, stat
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из MEDIA_ROOT файлы, на которые не ссылается ни одна '
+            'картинка рецепта или аватар.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено.')
+        parser.add_argument('--quarantine', metavar='DIR',
+                            help='Переносить файлы в DIR, а не удалять.')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Не трогать файлы моложе стольких секунд: '
+                                 'их запись в базу может быть ещё не '
+                                 'зафиксирована.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--verbose-files', action='store_true',
+                            help='Печатать путь каждого найденного файла.')
+
+    def handle(self, *args, **options):
+        root = os.path.abspath(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            raise CommandError(f'Каталог {root} не найден.')
+        quarantine = options['quarantine']
+        if quarantine:
+            quarantine = os.path.abspath(quarantine)
+        started = time.monotonic()
+        newer_than = time.time() - options['min_age']
+        scanned = removed = young = freed = 0
+        batch = []
+
+        def counted(files):
+            nonlocal scanned
+            for item in files:
+                scanned += 1
+                yield item
+
+        for path, stat in orphans(
+            counted(media_files(root, quarantine)),
+            referenced_names(options['batch_size'])
+        ):
+            if stat.st_mtime > newer_than:
+                young += 1
+                continue
+            if options['verbose_files']:
+                self.stdout.write(path)
+            batch.append((path, stat.st_size))
+            if len(batch) >= options['batch_size']:
+                count, size = self.process(root, batch, quarantine,
+                                           newer_than, options['dry_run'])
+                removed += count
+                freed += size
+                batch = []
+        count, size = self.process(root, batch, quarantine, newer_than,
+                                   options['dry_run'])
+        removed += count
+        freed += size
+
+        elapsed = time.monotonic() - started
+        action = ('Будет удалено' if options['dry_run']
+                  else 'Перенесено' if quarantine else 'Удалено')
+        self.stdout.write(self.style.SUCCESS(
+            f'Просмотрено файлов: {scanned} за {elapsed:.1f} с '
+            f'({scanned / max(elapsed, 1e-9):.0f} файлов/с). '
+            f'{action}: {removed} ({freed / 2 ** 20:.1f} МБ), '
+            f'пропущено новых: {young}.'
+        ))
+
+    def process(self, root, batch, quarantine, newer_than, dry_run):
+        """Удаляет или переносит пачку; возвращает (число, байты)."""
+        if dry_run:
+            return len(batch), sum(size for _, size in batch)
+        done = []
+        for path, size in batch:
+            source = os.path.join(root, path)
+            try:
+                # Файл могли переиспользовать после обхода, см.
+                # api.storage.touch.
+                if os.stat(source).st_mtime > newer_than:
+                    continue
+                if quarantine:
+                    target = Path(quarantine, path)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(source, target)
+                else:
+                    os.remove(source)
+            except FileNotFoundError:
+                continue
+            done.append((path, size))
+        MediaFile.objects.filter(name__in=[path for path, _ in done]).delete()
+        return len(done), sum(size for _, size in done)
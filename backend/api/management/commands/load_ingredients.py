@@ -0,0 +1,94 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+
+from api.cache import bump_data_version
+from api.models import Ingredients
+from django.core.management.base import BaseCommand, CommandError
+
+CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    """Читает массив объектов по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    with open(path, encoding='utf-8') as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            buffer += chunk
+            while True:
+                buffer = buffer.lstrip().lstrip(',').lstrip()
+                if not started:
+                    if not buffer:
+                        break
+                    if buffer[0] != '[':
+                        raise CommandError('Ожидается JSON-массив.')
+                    buffer = buffer[1:]
+                    started = True
+                    continue
+                if buffer.startswith(']'):
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    if not chunk:
+                        raise CommandError('Файл JSON обрывается.')
+                    break
+                buffer = buffer[end:]
+                yield item['name'], item['measurement_unit']
+            if not chunk:
+                return
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV или JSON пачками. Уже '
+            'существующие пары (название, единица) пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к ingredients.csv/.json.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+        inserted = skipped = 0
+        for batch in batches(reader(path), options['batch_size']):
+            rows = {(name.strip(), unit.strip()) for name, unit in batch}
+            existing = set(Ingredients.objects.filter(
+                name__in={name for name, _ in rows}
+            ).values_list('name', 'measurement_unit'))
+            new = rows - existing
+            Ingredients.objects.bulk_create(
+                [Ingredients(name=name, measurement_unit=unit)
+                 for name, unit in new],
+                ignore_conflicts=True
+            )
+            inserted += len(new)
+            skipped += len(batch) - len(new)
+        bump_data_version('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {skipped}.'
+        ))
@@ -0,0 +1,51 @@
+from concurrent.futures import wait
+
+from api.thumbnails import THUMBNAILS, get_executor, schedule
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Делает недостающие миниатюры картинок рецептов и аватаров, '
+            'например для загруженных до их появления.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window', type=int, default=settings.THUMBNAIL_WORKERS * 4,
+            help='Сколько картинок держать в очереди пула одновременно: '
+                 'каждая ждёт там целиком в памяти.'
+        )
+
+    def handle(self, *args, **options):
+        window = max(1, options['window'])
+        pending = []
+        scheduled = failed = 0
+        for model, (source_field, target_field) in THUMBNAILS.items():
+            instances = model.objects.exclude(**{source_field: ''}).exclude(
+                **{f'{source_field}__isnull': True}
+            ).only('pk', source_field, target_field)
+            for instance in instances.iterator():
+                future = schedule(instance)
+                if future is None:
+                    continue
+                scheduled += 1
+                pending.append(future)
+                if len(pending) >= window:
+                    failed += self.wait(pending)
+                    pending = []
+        failed += self.wait(pending)
+        # shutdown дожидается и колбэков, которые сохраняют миниатюры.
+        get_executor().shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Поставлено миниатюр: {scheduled}, с ошибкой: {failed}.'
+        ))
+
+    @staticmethod
+    def wait(futures):
+        """Ждёт пачку задач и возвращает число упавших.
+
+        Готовые задачи дальше не хранятся, вместе с ними из памяти уходят
+        и оригиналы, и отрисованные миниатюры.
+        """
+        done, _ = wait(futures)
+        return sum(future.exception() is not None for future in done)
@@ -0,0 +1,35 @@
+from api.models import Favorite, Recipe, ShoppingCart
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+User = get_user_model()
+
+
+def count_of(model, field):
+    """Подзапрос с числом строк model, ссылающихся на текущую запись."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает с нуля счётчики избранного, списков покупок '
+            'и рецептов автора.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=count_of(Favorite, 'recipe'),
+                cart_count=count_of(ShoppingCart, 'recipe'),
+            )
+            users = User.objects.update(
+                recipes_count=count_of(Recipe, 'author')
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}.'
+        ))
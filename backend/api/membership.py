@@ -0,0 +1,82 @@
+"""Множества рецептов и авторов, связанных с пользователем.
+
+Общая для всех закешированная страница рецептов дополняется флагами
+is_favorited, is_in_shopping_cart и is_subscribed по этим множествам
+без запросов к базе на каждую строку.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from users.models import Follow
+
+from .models import Favorite, ShoppingCart
+
+MEMBERSHIP_KEY = 'membership:{}'
+MEMBERSHIP_TOKEN_KEY = 'membership:{}:token'
+FAVORITES = 'favorites'
+SHOPPING_CART = 'shopping_cart'
+FOLLOWING = 'following'
+EMPTY_MEMBERSHIP = {
+    FAVORITES: frozenset(),
+    SHOPPING_CART: frozenset(),
+    FOLLOWING: frozenset(),
+}
+
+
+def _load(user_id):
+    return {
+        FAVORITES: frozenset(Favorite.objects.filter(
+            user_id=user_id
+        ).values_list('recipe_id', flat=True)),
+        SHOPPING_CART: frozenset(ShoppingCart.objects.filter(
+            user_id=user_id
+        ).values_list('recipe_id', flat=True)),
+        FOLLOWING: frozenset(Follow.objects.filter(
+            user_id=user_id
+        ).values_list('following_id', flat=True)),
+    }
+
+
+def get_membership(user):
+    """Множества пользователя: из кеша или одной загрузкой из базы.
+
+    Рядом с множествами хранится токен, который снимается при каждом
+    изменении. Множества, загруженные до изменения, а сохранённые после,
+    не совпадут с новым токеном и не будут отданы.
+    """
+    if not user.is_authenticated:
+        return EMPTY_MEMBERSHIP
+    key = MEMBERSHIP_KEY.format(user.id)
+    token_key = MEMBERSHIP_TOKEN_KEY.format(user.id)
+    cached = cache.get_many([key, token_key])
+    token = cached.get(token_key)
+    if token is None:
+        cache.add(token_key, uuid4().hex, timeout=None)
+        token = cache.get(token_key)
+    elif cached.get(key, (None, None))[0] == token:
+        return cached[key][1]
+    membership = _load(user.id)
+    cache.set(key, (token, membership), settings.RECIPE_CACHE_TIMEOUT)
+    return membership
+
+
+def invalidate_membership(user_id):
+    """Сбрасывает множества пользователя после фиксации транзакции.
+
+    Следующий запрос загрузит их заново: правка закешированного значения
+    на месте теряла бы одно из двух одновременных изменений.
+    """
+    transaction.on_commit(lambda: cache.delete_many([
+        MEMBERSHIP_KEY.format(user_id), MEMBERSHIP_TOKEN_KEY.format(user_id)
+    ]))
+
+
+def overlay(rows, membership):
+    """Проставляет персональные флаги в сериализованных рецептах."""
+    for row in rows:
+        row['is_favorited'] = row['id'] in membership[FAVORITES]
+        row['is_in_shopping_cart'] = row['id'] in membership[SHOPPING_CART]
+        author = row['author']
+        author['is_subscribed'] = author['id'] in membership[FOLLOWING]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-18 03:55
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляет по одной записи на каждую пару до создания ограничений."""
+    for model_name, fields in (('Favorite', ('user', 'recipe')),
+                               ('ShoppingCart', ('user', 'recipe')),
+                               ('TagsRecipe', ('tags', 'recipe'))):
+        model = apps.get_model('api', model_name)
+        keep = model.objects.values(*fields).annotate(
+            keep_id=Min('id')
+        ).values('keep_id')
+        model.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_recipe_created_at_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shoppingcart_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagsrecipe',
+            constraint=models.UniqueConstraint(fields=('tags', 'recipe'), name='unique_tags_recipe'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredients',
+            name='measurement_unit',
+            field=models.CharField(max_length=64, verbose_name='Единицы измерения'),
+        ),
+        migrations.AlterField(
+            model_name='ingredients',
+            name='name',
+            field=models.CharField(max_length=128, verbose_name='Название ингредиента'),
+        ),
+    ]
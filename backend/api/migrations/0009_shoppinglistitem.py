@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_shopping_lists(apps, schema_editor):
+    schema_editor.execute('''
+        INSERT INTO api_shoppinglistitem (user_id, ingredient_id, total_amount)
+        SELECT cart.user_id, ri.ingredients_id, SUM(ri.amount)
+        FROM api_shoppingcart cart
+        JOIN api_ingredientsrecipe ri ON ri.recipe_id = cart.recipe_id
+        GROUP BY 1, 2
+    ''')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_ingredient_name_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.ingredients', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Позиции списков покупок',
+                'default_related_name': 'shopping_list',
+                'constraints': [models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item')],
+            },
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
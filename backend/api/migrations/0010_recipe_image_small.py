@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_small',
+            field=models.ImageField(blank=True, editable=False, max_length=255, upload_to='', verbose_name='Миниатюра картинки'),
+        ),
+    ]
@@ -1,11 +1,28 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MaxLengthValidator, MinLengthValidator
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from users.models import Follow
+
+from .storage import get_content_addressed_storage
 
 User = get_user_model()
 
 MAX_LENGTH_EMAIL = 254
 MAX_LENGTH_TEXT = 150
+SEARCH_CONFIG = 'russian'
+
+
+def recipe_search_vector():
+    """Поисковый вектор рецепта: название важнее описания."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
 
 
 class Tags(models.Model):
@@ -13,6 +30,7 @@ class Tags(models.Model):
 
     name = models.CharField('Название тега', max_length=30)
     slug = models.SlugField('Слаг для тегов', max_length=50, unique=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'Тег'
@@ -25,14 +43,15 @@ class Tags(models.Model):
 class Ingredients(models.Model):
     """Модель для ингредиентов."""
 
-    name = models.CharField('Название ингредиента', max_length=30)
+    name = models.CharField('Название ингредиента', max_length=128)
     measurement_unit = models.CharField('Единицы измерения', blank=False,
-                                        max_length=50)
+                                        max_length=64)
     amount = models.CharField(
         'Колличество',
         max_length=50,
         blank=True
     )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -48,6 +67,71 @@ class Ingredients(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов для рецептов."""
+
+    def for_read(self, user=None):
+        """Рецепты со всеми данными для RecipeReadSerializer.
+
+        Автор, теги и ингредиенты подгружаются заранее, а признаки
+        is_favorited, is_in_shopping_cart и is_subscribed автора считаются
+        подзапросами, поэтому число запросов не зависит от размера страницы.
+        """
+        authors = User.objects.all()
+        if user is not None and user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, following=OuterRef('pk'))
+            ))
+            is_favorited = Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+            is_in_shopping_cart = Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        else:
+            authors = authors.annotate(is_subscribed=Value(False))
+            is_favorited = is_in_shopping_cart = Value(False)
+        return self.prefetch_related(
+            Prefetch('author', queryset=authors),
+            'tags',
+            Prefetch(
+                'ingredientsrecipe_set',
+                queryset=IngredientsRecipe.objects.select_related(
+                    'ingredients'
+                )
+            ),
+        ).annotate(
+            is_favorited=is_favorited,
+            is_in_shopping_cart=is_in_shopping_cart,
+        )
+
+    def first_per_author(self, limit=None):
+        """Не больше limit первых рецептов каждого автора.
+
+        Номер рецепта внутри автора считает ROW_NUMBER в подзапросе по
+        этому же набору, поэтому при подгрузке рецептов сразу для
+        страницы авторов запрос один. Подзапрос нумерует все рецепты
+        набора, так что набор стоит заранее сузить до авторов страницы.
+        Фильтровать по оконной функции напрямую Django 3.2 не умеет.
+        """
+        if limit is None:
+            return self
+        ranked = self.order_by().annotate(author_row=Window(
+            RowNumber(),
+            partition_by=F('author'),
+            order_by=[
+                F(field[1:]).desc() if field.startswith('-')
+                else F(field).asc()
+                for field in self.model._meta.ordering
+            ],
+        )).values('pk', 'author_row')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) AS ranked WHERE author_row <= %s',
+            (*params, limit)
+        ))
+
+
 class Recipe(models.Model):
     """Модель для рецептов."""
 
@@ -57,7 +141,10 @@ class Recipe(models.Model):
     name = models.CharField('Название рецепта', blank=False,
                             max_length=MAX_LENGTH_TEXT)
     image = models.ImageField('Картинка', blank=True,
-                              default=None, upload_to='recipes/images/')
+                              default=None, upload_to='recipes/images/',
+                              storage=get_content_addressed_storage)
+    image_small = models.ImageField('Миниатюра картинки', blank=True,
+                                    max_length=255, editable=False)
     text = models.TextField('Описание рецепта', max_length=100000)
     ingredients = models.ManyToManyField(Ingredients,
                                          verbose_name='Ингредиенты',
@@ -75,12 +162,30 @@ class Recipe(models.Model):
                                     ])
     created_at = models.DateTimeField(auto_now_add=True,
                                       verbose_name='Дата публикации')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Дата изменения')
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное', default=0, editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'Добавлений в список покупок', default=0, editable=False
+    )
+    search_vector = SearchVectorField('Поисковый вектор', null=True,
+                                      editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['created_at', 'name', 'author']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='recipe_created_at_id_idx'),
+            GinIndex(fields=['search_vector'],
+                     name='recipe_search_vector_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -90,6 +195,12 @@ class TagsRecipe(models.Model):
     tags = models.ForeignKey(Tags, on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tags', 'recipe'],
+                                    name='unique_tags_recipe')
+        ]
+
     def __str__(self):
         return f'{self.tags} {self.recipe}'
 
@@ -126,6 +237,10 @@ class UserRecipeModel(models.Model):
 
     class Meta:
         abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_%(class)s_user_recipe')
+        ]
 
 
 class Favorite(UserRecipeModel):
@@ -154,3 +269,52 @@ class ShoppingCart(UserRecipeModel):
             f'Пользователь {self.user.username} добавил в список '
             f' покупок рецепт {self.recipe}'
         )
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+
+    Таблица обновляется при добавлении и удалении рецептов из списка
+    покупок и при изменении ингредиентов рецептов, см. api.shopping_list.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredients,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.IntegerField('Количество', default=0)
+
+    class Meta:
+        default_related_name = 'shopping_list'
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.total_amount}'
+
+
+class MediaFile(models.Model):
+    """Число ссылок на файл в хранилище с именами по содержимому.
+
+    См. api.storage.
+    """
+
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация ленты рецептов.
+
+    Позиция страницы задаётся ключом (created_at, id), поэтому запрос
+    опирается на составной индекс и не пересчитывает предыдущие строки.
+    """
+
+    ordering = ('created_at', 'id')
+    page_size_query_param = 'limit'
+    max_page_size = 100
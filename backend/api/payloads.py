@@ -0,0 +1,51 @@
+"""Готовые ответы для неотфильтрованных списков тегов и ингредиентов.
+
+Справочники меняются редко, поэтому полный ответ рендерится в байты один
+раз вместе со сжатой gzip-копией. Новая версия собирается при первом
+запросе после того, как сигналы поменяли версию справочника.
+"""
+import gzip
+from hashlib import md5
+
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from rest_framework.renderers import JSONRenderer
+
+from .cache import get_data_version
+
+_payloads = {}
+
+
+class Payload:
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.gzipped = gzip.compress(body)
+        self.etag = quote_etag(md5(body).hexdigest())
+
+
+def get_payload(name, build):
+    """Готовый ответ справочника name; build возвращает данные для JSON."""
+    version = get_data_version(name)
+    payload = _payloads.get(name)
+    if payload is None or payload.version != version:
+        payload = Payload(version, JSONRenderer().render(build()))
+        _payloads[name] = payload
+    return payload
+
+
+def payload_response(request, payload):
+    response = get_conditional_response(request, etag=payload.etag)
+    if response is None:
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(payload.gzipped,
+                                    content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(payload.body,
+                                    content_type='application/json')
+    response['ETag'] = payload.etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
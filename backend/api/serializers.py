@@ -1,26 +1,17 @@
-import base64
-
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers, validators
 from users.models import Follow, User
 from users.serializers import UserSerializer
 
+from .fields import Base64ImageField, ThumbnailField
 from .models import (Favorite, Ingredients, IngredientsRecipe, Recipe,
                      ShoppingCart, Tags)
+from .shopping_list import change_recipe_ingredients, lock_recipes
+from .storage import release
 from .validators import recipe_validator
 
 
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
-
-
 class IngredientsSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Ingredients."""
 
@@ -38,30 +29,34 @@ class TagsSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    """Сериализатор для связи ингредиента с рецептом."""
+    """Сериализатор для записи ингредиентов рецепта."""
     id = serializers.IntegerField()
     amount = serializers.IntegerField()
-    name = serializers.SerializerMethodField()
-    measurement_unit = serializers.SerializerMethodField()
 
     class Meta:
         model = IngredientsRecipe
         fields = (
             'id',
             'amount',
-            'name',
-            'measurement_unit'
         )
 
-    def get_name(self, obj):
-        ingredient = IngredientsRecipe.objects.filter(
-            id=obj.id).values('ingredients__name')
-        return ingredient[0]['ingredients__name']
 
-    def get_measurement_unit(self, obj):
-        ingredient = IngredientsRecipe.objects.filter(
-            id=obj.id).values('ingredients__measurement_unit')
-        return ingredient[0]['ingredients__measurement_unit']
+class RecipeIngredientReadSerializer(serializers.ModelSerializer):
+    """Сериализатор для чтения ингредиентов рецепта."""
+    id = serializers.ReadOnlyField(source='ingredients.id')
+    name = serializers.ReadOnlyField(source='ingredients.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredients.measurement_unit'
+    )
+
+    class Meta:
+        model = IngredientsRecipe
+        fields = (
+            'id',
+            'amount',
+            'name',
+            'measurement_unit'
+        )
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -92,33 +87,64 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         author = self.context.get('request').user
-        recipe = Recipe.objects.create(author=author, **validated_data)
-        recipe.tags.set(tags)
-        ingredients_data = [
-            IngredientsRecipe(
-                ingredients_id=ingredient['id'],
-                recipe=recipe,
-                amount=ingredient['amount']
-            ) for ingredient in ingredients
-        ]
-        IngredientsRecipe.objects.bulk_create(ingredients_data)
+        # Кеш сбрасывается после фиксации, когда у рецепта уже есть и
+        # теги, и ингредиенты.
+        with transaction.atomic():
+            recipe = Recipe.objects.create(author=author, **validated_data)
+            recipe.tags.set(tags)
+            ingredients_data = [
+                IngredientsRecipe(
+                    ingredients_id=ingredient['id'],
+                    recipe=recipe,
+                    amount=ingredient['amount']
+                ) for ingredient in ingredients
+            ]
+            IngredientsRecipe.objects.bulk_create(ingredients_data)
         return recipe
 
     def update(self, instance, validated_data):
+        """Меняет только отличающиеся строки ингредиентов и тегов."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        IngredientsRecipe.objects.filter(recipe=instance).delete()
-        ingredients_data = [
-            IngredientsRecipe(
-                ingredients_id=ingredient['id'],
-                recipe=instance,
-                amount=ingredient['amount']
-            ) for ingredient in ingredients
-        ]
-        IngredientsRecipe.objects.bulk_create(ingredients_data)
-        return super().update(instance, validated_data)
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        with transaction.atomic():
+            lock_recipes([instance.id])
+            instance.tags.set(tags)
+            current = {
+                row.ingredients_id: row
+                for row in IngredientsRecipe.objects.filter(recipe=instance)
+            }
+            old_amounts = {
+                ingredient_id: row.amount
+                for ingredient_id, row in current.items()
+            }
+            changed = []
+            for ingredient_id, amount in new_amounts.items():
+                row = current.get(ingredient_id)
+                if row is not None and row.amount != amount:
+                    row.amount = amount
+                    changed.append(row)
+            IngredientsRecipe.objects.bulk_update(changed, ['amount'])
+            IngredientsRecipe.objects.bulk_create([
+                IngredientsRecipe(ingredients_id=ingredient_id,
+                                  recipe=instance, amount=amount)
+                for ingredient_id, amount in new_amounts.items()
+                if ingredient_id not in current
+            ])
+            removed = current.keys() - new_amounts.keys()
+            if removed:
+                IngredientsRecipe.objects.filter(
+                    id__in=[current[key].id for key in removed]
+                ).delete()
+            change_recipe_ingredients(instance.id, old_amounts, new_amounts)
+            old_image = instance.image.name
+            instance = super().update(instance, validated_data)
+            if 'image' in validated_data:
+                release(old_image)
+            return instance
 
     def to_representation(self, instance):
         return RecipeReadSerializer(instance, context=self.context).data
@@ -128,10 +154,13 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Recipe."""
     author = UserSerializer(read_only=True)
     tags = TagsSerializer(many=True)
-    ingredients = RecipeIngredientSerializer(many=True,
-                                             source='ingredientsrecipe_set')
+    ingredients = RecipeIngredientReadSerializer(
+        many=True,
+        source='ingredientsrecipe_set'
+    )
     cooking_time = serializers.IntegerField()
     image = Base64ImageField()
+    image_small = ThumbnailField('image')
     is_in_shopping_cart = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
 
@@ -144,11 +173,14 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   'cooking_time',
                   'text',
                   'image',
+                  'image_small',
                   'is_favorited',
                   'is_in_shopping_cart')
         model = Recipe
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get("request")
 
         return bool(
@@ -160,6 +192,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get("request")
 
         return bool(
@@ -174,13 +208,15 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Recipe."""
     image = Base64ImageField()
+    image_small = ThumbnailField('image')
     cooking_time = serializers.IntegerField()
 
     class Meta:
         fields = ('id',
                   'name',
                   'cooking_time',
-                  'image')
+                  'image',
+                  'image_small')
         model = Recipe
         read_only_fields = (
             'image',
@@ -189,10 +225,19 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         )
 
 
+def get_recipes_limit(request):
+    """Параметр recipes_limit, если это неотрицательное целое."""
+    value = request.query_params.get('recipes_limit') if request else None
+    if value is None or not value.isdigit():
+        return None
+    return int(value)
+
+
 class FollowInfoSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.ReadOnlyField()
     recipes = serializers.SerializerMethodField(read_only=True)
+    avatar_small = ThumbnailField('avatar')
 
     class Meta:
         model = User
@@ -203,6 +248,7 @@ class FollowInfoSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'avatar',
+            'avatar_small',
             'is_subscribed',
             'recipes',
             'recipes_count'
@@ -215,18 +261,19 @@ class FollowInfoSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes_queryset = Recipe.objects.filter(author=obj)
-        if recipes_limit is not None:
-            recipes_queryset = recipes_queryset[:int(recipes_limit)]
+        if hasattr(obj, 'limited_recipes'):
+            recipes_queryset = obj.limited_recipes
+        else:
+            recipes_queryset = Recipe.objects.filter(author=obj)
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                recipes_queryset = recipes_queryset[:recipes_limit]
         serializer = RecipeShortSerializer(recipes_queryset, many=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get("request")
 
         return bool(
@@ -265,39 +312,14 @@ class FollowSerializer(serializers.ModelSerializer):
         ).data
 
 
-class UserRecipeSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        fields = ('user', 'recipe')
-
-    def to_representation(self, instance):
-        return RecipeShortSerializer(
-            instance.recipe,
-            context={"request": self.context.get("request")},
-        ).data
-
-
-class FavoriteSerializer(UserRecipeSerializer):
-
-    class Meta(UserRecipeSerializer.Meta):
-        model = Favorite
-        validators = [
-            validators.UniqueTogetherValidator(
-                queryset=Favorite.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт в избранном',
-            ),
-        ]
-
-
-class ShoppingSerializer(UserRecipeSerializer):
+class BulkRecipesSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления и удаления."""
+    ids = serializers.ListField(
+        # Больше bigint id рецепта не бывает.
+        child=serializers.IntegerField(min_value=1, max_value=2 ** 63 - 1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX,
+    )
 
-    class Meta(UserRecipeSerializer.Meta):
-        model = ShoppingCart
-        validators = [
-            validators.UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт в списке покупок',
-            ),
-        ]
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,167 @@
+"""Инкрементальное обновление материализованного списка покупок.
+
+ShoppingListItem хранит для каждого пользователя сумму количеств
+ингредиентов по всем рецептам в его списке покупок. Изменения
+применяются одной вставкой с ON CONFLICT, которая прибавляет разницу
+к существующей строке, после чего обнулившиеся позиции удаляются.
+
+Правка ингредиентов рецепта и изменение корзин с этим рецептом идут
+под блокировкой строки рецепта (lock_recipes), иначе рецепт, добавленный
+между правкой и её фиксацией, попал бы в список со старыми количествами.
+"""
+from django.db import connection, transaction
+
+from .models import IngredientsRecipe, Recipe, ShoppingCart, ShoppingListItem
+
+ITEMS = ShoppingListItem._meta.db_table
+CART = ShoppingCart._meta.db_table
+RECIPE_INGREDIENTS = IngredientsRecipe._meta.db_table
+
+UPSERT = f'''
+    INSERT INTO {ITEMS} (user_id, ingredient_id, total_amount)
+    {{select}}
+    ON CONFLICT (user_id, ingredient_id) DO UPDATE
+    SET total_amount = {ITEMS}.total_amount + EXCLUDED.total_amount
+'''
+LIVE_AGGREGATE = f'''
+    SELECT cart.user_id, ri.ingredients_id AS ingredient_id,
+           SUM(ri.amount) AS total_amount
+    FROM {CART} cart
+    JOIN {RECIPE_INGREDIENTS} ri ON ri.recipe_id = cart.recipe_id
+'''
+
+# Фрагменты WITH для запросов, которые меняют список покупок одного
+# пользователя (%(user_id)s) в том же выражении, что и корзину. Рецепты
+# берутся из предшествующего CTE changed(recipe_id).
+ADD_RECIPES_CTE = f'''
+    shopping_list AS (
+        INSERT INTO {ITEMS} (user_id, ingredient_id, total_amount)
+        SELECT %(user_id)s, ingredients_id, SUM(amount)
+        FROM {RECIPE_INGREDIENTS}
+        WHERE recipe_id IN (SELECT recipe_id FROM changed)
+        GROUP BY ingredients_id
+        ON CONFLICT (user_id, ingredient_id) DO UPDATE
+        SET total_amount = {ITEMS}.total_amount + EXCLUDED.total_amount
+    )
+'''
+REMOVE_RECIPES_CTE = f'''
+    removed AS (
+        SELECT ingredients_id AS ingredient_id, SUM(amount) AS amount
+        FROM {RECIPE_INGREDIENTS}
+        WHERE recipe_id IN (SELECT recipe_id FROM changed)
+        GROUP BY ingredients_id
+    ),
+    emptied_items AS (
+        DELETE FROM {ITEMS} item USING removed
+        WHERE item.user_id = %(user_id)s
+            AND item.ingredient_id = removed.ingredient_id
+            AND item.total_amount <= removed.amount
+    ),
+    reduced_items AS (
+        UPDATE {ITEMS} item
+        SET total_amount = item.total_amount - removed.amount
+        FROM removed
+        WHERE item.user_id = %(user_id)s
+            AND item.ingredient_id = removed.ingredient_id
+            AND item.total_amount > removed.amount
+    )
+'''
+
+
+def lock_recipes(recipe_ids):
+    """Блокирует строки рецептов до конца транзакции; возвращает их id.
+
+    Блокировка берётся отдельным запросом до изменения: запрос, который
+    её дождался, читает ингредиенты уже после фиксации чужой правки.
+    Внутри того же выражения это не помогло бы, снимок данных у него
+    взят до ожидания.
+    """
+    return list(Recipe.objects.select_for_update(no_key=True).filter(
+        id__in=recipe_ids
+    ).order_by('id').values_list('id', flat=True))
+
+
+def _apply(select, params, user_filter, user_params):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(UPSERT.format(select=select), params)
+        cursor.execute(
+            f'DELETE FROM {ITEMS} WHERE total_amount <= 0 '
+            f'AND user_id {user_filter}',
+            user_params
+        )
+
+
+def change_recipes(user_id, recipe_ids, sign):
+    """Добавляет (sign=1) или убирает (sign=-1) рецепты из списка."""
+    _apply(
+        f'''SELECT %s, ingredients_id, SUM(amount) * %s
+            FROM {RECIPE_INGREDIENTS}
+            WHERE recipe_id = ANY(%s)
+            GROUP BY ingredients_id''',
+        [user_id, sign, list(recipe_ids)],
+        '= %s', [user_id]
+    )
+
+
+def change_recipe_ingredients(recipe_id, old_amounts, new_amounts):
+    """Переносит правку ингредиентов рецепта в списки всех пользователей.
+
+    old_amounts и new_amounts — словари {id ингредиента: количество}.
+    Рецепт должен быть заблокирован через lock_recipes до чтения
+    old_amounts.
+    """
+    deltas = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    _apply(
+        f'''SELECT cart.user_id, delta.ingredient_id, delta.amount
+            FROM {CART} cart,
+                 unnest(%s::bigint[], %s::integer[])
+                     AS delta(ingredient_id, amount)
+            WHERE cart.recipe_id = %s''',
+        [list(deltas), list(deltas.values()), recipe_id],
+        f'IN (SELECT user_id FROM {CART} WHERE recipe_id = %s)',
+        [recipe_id]
+    )
+
+
+def find_mismatches():
+    """Позиции, которые расходятся с живым агрегатом по корзинам.
+
+    Возвращает кортежи (user_id, ingredient_id, ожидаемое, сохранённое).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            SELECT COALESCE(live.user_id, item.user_id),
+                   COALESCE(live.ingredient_id, item.ingredient_id),
+                   live.total_amount, item.total_amount
+            FROM ({LIVE_AGGREGATE} GROUP BY 1, 2) live
+            FULL OUTER JOIN {ITEMS} item
+                ON item.user_id = live.user_id
+                AND item.ingredient_id = live.ingredient_id
+            WHERE live.total_amount IS DISTINCT FROM item.total_amount
+            ORDER BY 1, 2
+        ''')
+        return cursor.fetchall()
+
+
+def rebuild(user_ids=None):
+    """Пересобирает списки пользователей (или всех) из живого агрегата."""
+    user_filter = ''
+    params = []
+    if user_ids is not None:
+        user_filter = 'WHERE user_id = ANY(%s)'
+        params = [list(user_ids)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {ITEMS} {user_filter}', params)
+        cursor.execute(
+            f'''INSERT INTO {ITEMS} (user_id, ingredient_id, total_amount)
+                SELECT * FROM ({LIVE_AGGREGATE} GROUP BY 1, 2) live
+                {user_filter}''',
+            params
+        )
@@ -0,0 +1,212 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+from users.models import Follow, User
+from users.serializers import UserSerializer
+
+from .cache import bump_data_version, invalidate_recipes, invalidate_tags
+from .membership import invalidate_membership
+from .models import (Favorite, Ingredients, IngredientsRecipe, Recipe,
+                     ShoppingCart, Tags, TagsRecipe, recipe_search_vector)
+from .shopping_list import change_recipes
+from .storage import release
+from .thumbnails import schedule
+
+
+def change_counter(queryset, field, delta):
+    queryset.update(**{field: F(field) + delta})
+
+
+def recipes_changed(recipe_ids, all_lists=False):
+    """Обновляет версию рецептов, чьё представление изменилось."""
+    recipe_ids = list(recipe_ids)
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+    invalidate_recipes(recipe_ids, all_lists=all_lists)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, update_fields, **kwargs):
+    searchable = update_fields is None or bool(
+        {'name', 'text'} & set(update_fields)
+    )
+    if searchable:
+        Recipe.objects.filter(id=instance.id).update(
+            search_vector=recipe_search_vector()
+        )
+    if created:
+        change_counter(User.objects.filter(id=instance.author_id),
+                       'recipes_count', 1)
+    # Новые название или описание меняют состав и порядок страниц поиска,
+    # где этого рецепта ещё нет.
+    invalidate_recipes([instance.id], all_lists=created or searchable)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, update_fields, **kwargs):
+    if update_fields is None or 'image' in update_fields:
+        transaction.on_commit(lambda: schedule(
+            instance, lambda: recipes_changed([instance.id])
+        ))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(User.objects.filter(id=instance.author_id),
+                   'recipes_count', -1)
+    invalidate_recipes([instance.id], all_lists=True)
+    release(instance.image.name)
+
+
+@receiver(post_save, sender=IngredientsRecipe)
+@receiver(post_delete, sender=IngredientsRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    recipes_changed([instance.recipe_id])
+
+
+@receiver(post_save, sender=TagsRecipe)
+@receiver(post_delete, sender=TagsRecipe)
+def recipe_tag_changed(sender, instance, **kwargs):
+    recipes_changed([instance.recipe_id], all_lists=True)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_set(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recipes_changed([instance.id], all_lists=True)
+    elif action == 'pre_clear':
+        recipes_changed(
+            instance.recipes.values_list('id', flat=True), all_lists=True
+        )
+    elif action in ('post_add', 'post_remove'):
+        recipes_changed(pk_set, all_lists=True)
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_delete, sender=Tags)
+def tag_saved(sender, instance, **kwargs):
+    invalidate_tags()
+    bump_data_version('tags')
+
+
+@receiver(post_save, sender=Tags)
+@receiver(pre_delete, sender=Tags)
+def tag_changed(sender, instance, **kwargs):
+    recipes_changed(
+        TagsRecipe.objects.filter(tags=instance).values_list(
+            'recipe_id', flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+def ingredient_saved(sender, instance, **kwargs):
+    bump_data_version('ingredients')
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(pre_delete, sender=Ingredients)
+def ingredient_changed(sender, instance, **kwargs):
+    recipes_changed(
+        IngredientsRecipe.objects.filter(ingredients=instance).values_list(
+            'recipe_id', flat=True
+        )
+    )
+
+
+def user_recipe_changed(instance, counter, added):
+    change_counter(Recipe.objects.filter(id=instance.recipe_id), counter,
+                   1 if added else -1)
+    invalidate_membership(instance.user_id)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        user_recipe_changed(instance, 'favorites_count', True)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    user_recipe_changed(instance, 'favorites_count', False)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        change_recipes(instance.user_id, [instance.recipe_id], 1)
+        user_recipe_changed(instance, 'cart_count', True)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removing(sender, instance, **kwargs):
+    # До удаления, пока строки ингредиентов удаляемого рецепта на месте.
+    change_recipes(instance.user_id, [instance.recipe_id], -1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    user_recipe_changed(instance, 'cart_count', False)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    invalidate_membership(instance.user_id)
+
+
+# Поля пользователя, которые страницы рецептов показывают как автора.
+AUTHOR_FIELDS = tuple(
+    name for name in UserSerializer.Meta.fields
+    if name != 'id' and name in {
+        field.name for field in User._meta.concrete_fields
+    }
+)
+
+
+@receiver(pre_save, sender=User)
+def author_saving(sender, instance, update_fields, **kwargs):
+    # Данные автора встроены в страницы его рецептов, а у post_save
+    # прежних значений уже нет.
+    instance._author_changed = False
+    if instance._state.adding or (
+        update_fields is not None
+        and not set(AUTHOR_FIELDS) & set(update_fields)
+    ):
+        return
+    old = User.objects.filter(pk=instance.pk).values(*AUTHOR_FIELDS).first()
+    instance._author_changed = old is None or any(
+        (old[name] or '') != (User._meta.get_field(name).get_prep_value(
+            getattr(instance, name)
+        ) or '')
+        for name in AUTHOR_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, update_fields, **kwargs):
+    def author_recipes_changed():
+        recipes_changed(Recipe.objects.filter(
+            author_id=instance.id
+        ).values_list('id', flat=True), all_lists=True)
+
+    if update_fields is None or 'avatar' in update_fields:
+        transaction.on_commit(
+            lambda: schedule(instance, author_recipes_changed)
+        )
+    # После schedule, который уже сбросил старую миниатюру: страницы
+    # сразу показывают новые данные автора, новый оригинал аватара или
+    # его отсутствие, даже если миниатюра так и не получится.
+    if getattr(instance, '_author_changed', False):
+        transaction.on_commit(author_recipes_changed)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    release(instance.avatar.name)
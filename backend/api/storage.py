@@ -0,0 +1,104 @@
+"""Хранилище картинок с именами по содержимому.
+
+Файл сохраняется как <каталог upload_to>/<2 символа>/<sha256>.<расширение>,
+поэтому одинаковые загрузки указывают на один файл и повторно не
+пишутся, а URL никогда не меняет содержимое. Число ссылок на файл
+хранится в MediaFile: save прибавляет ссылку, delete убирает и удаляет
+файл, только когда ссылок не осталось. Файлы, загруженные до появления
+хранилища, в MediaFile не записаны и удаляются сразу, как раньше.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+
+HASH_PREFIX_LENGTH = 2
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    @staticmethod
+    def table():
+        return apps.get_model('api', 'MediaFile')._meta.db_table
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:HASH_PREFIX_LENGTH],
+                              digest + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        # Ссылка учитывается до записи: параллельный delete увидит её и
+        # не удалит файл, который сейчас сохраняется.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''INSERT INTO {self.table()} (name, ref_count)
+                    VALUES (%s, 1)
+                    ON CONFLICT (name) DO UPDATE
+                    SET ref_count = {self.table()}.ref_count + 1''',
+                [name]
+            )
+        if self.exists(name):
+            touch(self, name)
+            return name
+        # Пишем под временным именем и подменяем целиком: одновременная
+        # загрузка тех же байтов не получит имя с суффиксом, а читатели
+        # не увидят недописанный файл.
+        directory, filename = posixpath.split(name)
+        temporary = super()._save(
+            posixpath.join(directory, f'.{uuid.uuid4().hex}.{filename}'),
+            content
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def delete(self, name):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'''UPDATE {self.table()} SET ref_count = ref_count - 1
+                    WHERE name = %s RETURNING ref_count''',
+                [name]
+            )
+            row = cursor.fetchone()
+            if row is not None and row[0] > 0:
+                return
+            cursor.execute(f'DELETE FROM {self.table()} WHERE name = %s',
+                           [name])
+            super().delete(name)
+
+
+def touch(storage, name):
+    """Обновляет время изменения файла, на который снова сослались.
+
+    gc_media не трогает недавно изменённые файлы, поэтому не удалит
+    переиспользованный файл, пока ссылка на него фиксируется в базе.
+    """
+    try:
+        os.utime(storage.path(name))
+    except (NotImplementedError, FileNotFoundError):
+        pass
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_content_addressed_storage():
+    return content_addressed_storage
+
+
+def release(name):
+    """Убирает ссылку на файл после фиксации текущей транзакции."""
+    if name:
+        transaction.on_commit(
+            lambda: content_addressed_storage.delete(name)
+        )
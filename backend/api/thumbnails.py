@@ -0,0 +1,115 @@
+"""Миниатюры картинок рецептов и аватаров.
+
+После сохранения картинки её уменьшенная WebP-копия считается в пуле
+процессов и кладётся рядом с оригиналом как <имя>.small.webp. Имя копии
+записывается в поле миниатюры только если оригинал за это время не
+поменялся; пока поля нет, сериализаторы отдают оригинал.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from users.models import User
+
+from .imaging import render_webp
+from .models import Recipe
+from .storage import touch
+
+logger = logging.getLogger(__name__)
+
+# Модель -> (поле оригинала, поле миниатюры).
+THUMBNAILS = {
+    Recipe: ('image', 'image_small'),
+    User: ('avatar', 'avatar_small'),
+}
+SUFFIX = '.small.webp'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS
+        )
+    return _executor
+
+
+def thumbnail_name(name):
+    return os.path.splitext(name)[0] + SUFFIX if name else ''
+
+
+def schedule(instance, ready=None):
+    """Ставит миниатюру в очередь, если она не соответствует оригиналу.
+
+    ready вызывается после записи миниатюры. Возвращает Future или None.
+    """
+    model = type(instance)
+    source_field, target_field = THUMBNAILS[model]
+    source = getattr(instance, source_field)
+    target = getattr(instance, target_field)
+    if target.name == thumbnail_name(source.name):
+        return None
+    if target.name:
+        model.objects.filter(pk=instance.pk).update(**{target_field: ''})
+        setattr(instance, target_field, '')
+    if not source:
+        return None
+    name = thumbnail_name(source.name)
+    storage = model._meta.get_field(target_field).storage
+    if storage.exists(name):
+        # Такую же картинку уже загружали, миниатюра для неё готова.
+        touch(storage, name)
+        model.objects.filter(
+            pk=instance.pk, **{source_field: source.name}
+        ).update(**{target_field: name})
+        setattr(instance, target_field, name)
+        if ready is not None:
+            ready()
+        return None
+    with source.open('rb') as file:
+        data = file.read()
+    future = get_executor().submit(render_webp, data,
+                                   settings.THUMBNAIL_SIZE,
+                                   settings.THUMBNAIL_QUALITY)
+    future.add_done_callback(partial(
+        _store, model, instance.pk, source.name, ready,
+        threading.get_ident()
+    ))
+    return future
+
+
+def _store(model, pk, source_name, ready, caller, future):
+    source_field, target_field = THUMBNAILS[model]
+    try:
+        content = future.result()
+    except Exception:
+        logger.exception('Не удалось сделать миниатюру %s', source_name)
+        return
+    storage = model._meta.get_field(target_field).storage
+    name = thumbnail_name(source_name)
+    try:
+        # Одинаковые оригиналы хранятся одним файлом, и миниатюра у них
+        # общая: готовую не перезаписываем и не удаляем.
+        if storage.exists(name):
+            touch(storage, name)
+        else:
+            name = storage.save(name, ContentFile(content))
+        updated = model.objects.filter(
+            pk=pk, **{source_field: source_name}
+        ).update(**{target_field: name})
+        if updated and ready is not None:
+            ready()
+    except Exception:
+        logger.exception('Не удалось сохранить миниатюру %s', name)
+    finally:
+        # Колбэк выполняется в служебном потоке пула, у которого своё
+        # соединение с базой.
+        if threading.get_ident() != caller:
+            connection.close()
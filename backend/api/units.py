@@ -0,0 +1,135 @@
+"""Сведение списка покупок к совместимым единицам измерения.
+
+Таблица пересчёта задаётся один раз: единица -> (величина, множитель к
+базовой единице величины). Для справочника ингредиентов по ней строятся
+массивы, выровненные по id: группа (название + величина) и множитель.
+Массивы пересобираются, когда сигналы Ingredients меняют версию
+справочника, как и индекс автодополнения.
+
+Агрегация списка — один проход numpy: поиск позиций ингредиентов,
+пересчёт количеств в базовые единицы и суммирование по группам через
+bincount. Итог по группе выводится в самой крупной из встретившихся в
+ней единиц, поэтому позиция без пары остаётся в своей единице.
+"""
+import re
+
+import numpy as np
+
+from .cache import get_data_version
+from .models import Ingredients
+
+MASS = 'масса'
+VOLUME = 'объём'
+COUNT = 'штуки'
+
+CONVERSIONS = {
+    'мг': (MASS, 0.001),
+    'г': (MASS, 1),
+    'кг': (MASS, 1000),
+    'капля': (VOLUME, 0.05),
+    'мл': (VOLUME, 1),
+    'ч. л.': (VOLUME, 5),
+    'дес. л.': (VOLUME, 10),
+    'ст. л.': (VOLUME, 15),
+    'стакан': (VOLUME, 200),
+    'л': (VOLUME, 1000),
+    'шт.': (COUNT, 1),
+    'десяток': (COUNT, 10),
+}
+ALIASES = {
+    'гр': 'г',
+    'грамм': 'г',
+    'килограмм': 'кг',
+    'литр': 'л',
+    'шт': 'шт.',
+    'штука': 'шт.',
+    'чайная ложка': 'ч. л.',
+    'столовая ложка': 'ст. л.',
+}
+DECIMALS = 2
+INNER_DOT = re.compile(r'\.\s*(?=\S)')
+
+_table = None
+
+
+def normalize_unit(unit):
+    """Приводит запись единицы к ключу таблицы: «Ч.Л.» -> «ч. л.»."""
+    unit = ' '.join(INNER_DOT.sub('. ', unit.casefold()).split())
+    return ALIASES.get(unit, unit)
+
+
+def convert(unit):
+    """Величина и множитель единицы; незнакомая единица — сама себе."""
+    unit = normalize_unit(unit)
+    return CONVERSIONS.get(unit, (unit, 1))
+
+
+class UnitTable:
+
+    def __init__(self, version, rows):
+        self.version = version
+        ids, groups, factors = [], [], []
+        codes = {}
+        self.names = []
+        self.units = []
+        for ingredient_id, name, unit in rows:
+            quantity, factor = convert(unit)
+            key = (name.casefold(), quantity)
+            if key not in codes:
+                codes[key] = len(self.names)
+                self.names.append(name)
+                self.units.append({})
+            self.units[codes[key]].setdefault(factor, unit)
+            ids.append(ingredient_id)
+            groups.append(codes[key])
+            factors.append(factor)
+        order = np.argsort(np.array(ids, dtype=np.int64), kind='stable')
+        self.ids = np.array(ids, dtype=np.int64)[order]
+        self.groups = np.array(groups, dtype=np.int64)[order]
+        self.factors = np.array(factors, dtype=np.float64)[order]
+
+    def aggregate(self, ingredient_ids, amounts):
+        """Строки (название, единица, количество), сведённые по группам.
+
+        Ингредиенты, которых нет в таблице, пропускаются.
+        """
+        ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        positions = np.searchsorted(self.ids, ingredient_ids)
+        positions = np.minimum(positions, max(len(self.ids) - 1, 0))
+        known = (self.ids[positions] == ingredient_ids
+                 if len(self.ids) else np.zeros(len(ingredient_ids), bool))
+        positions = positions[known]
+        groups, inverse = np.unique(self.groups[positions],
+                                    return_inverse=True)
+        factors = self.factors[positions]
+        totals = np.bincount(inverse, weights=amounts[known] * factors,
+                             minlength=len(groups))
+        display = np.zeros(len(groups))
+        np.maximum.at(display, inverse, factors)
+        totals = np.round(totals / display, DECIMALS)
+        rows = [
+            (self.names[group], self.units[group][factor],
+             format_amount(total))
+            for group, factor, total in zip(
+                groups.tolist(), display.tolist(), totals.tolist()
+            )
+        ]
+        rows.sort(key=lambda row: (row[0].casefold(), row[1]))
+        return rows
+
+
+def format_amount(amount):
+    if amount == int(amount):
+        return int(amount)
+    return amount
+
+
+def get_table():
+    global _table
+    version = get_data_version('ingredients')
+    if _table is None or _table.version != version:
+        _table = UnitTable(version, Ingredients.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        ).iterator())
+    return _table
@@ -0,0 +1,103 @@
+"""Добавление рецепта в избранное или список покупок одним запросом.
+
+Вставка идёт через INSERT ... ON CONFLICT DO NOTHING по уникальному
+ограничению (user, recipe), поэтому одновременные повторные запросы не
+падают на IntegrityError, а получают «уже добавлен». Счётчик рецепта и
+материализованный список покупок меняются в том же выражении через CTE;
+сигналы при этом не отправляются, и множества в кеше сбрасываются явно.
+Для списка покупок перед выражением рецепт блокируется, см.
+api.shopping_list.lock_recipes.
+"""
+from contextlib import nullcontext
+
+from django.db import IntegrityError, connection, transaction
+
+from .membership import invalidate_membership
+from .models import Favorite, Recipe, ShoppingCart
+from .shopping_list import ADD_RECIPES_CTE, REMOVE_RECIPES_CTE, lock_recipes
+
+RECIPES = Recipe._meta.db_table
+RECIPE_FIELDS = ('id', 'name', 'image', 'image_small', 'cooking_time')
+
+TRACKED = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'cart_count',
+}
+SHOPPING_LIST_CTE = {
+    ShoppingCart: (ADD_RECIPES_CTE, REMOVE_RECIPES_CTE),
+}
+
+ADD = '''
+    WITH changed AS (
+        INSERT INTO {table} (user_id, recipe_id)
+        SELECT %(user_id)s, id FROM {recipes} WHERE id = %(recipe_id)s
+        ON CONFLICT (user_id, recipe_id) DO NOTHING
+        RETURNING recipe_id
+    ),
+    counter AS (
+        UPDATE {recipes} SET {counter} = {counter} + 1
+        WHERE id IN (SELECT recipe_id FROM changed)
+    ){extra}
+    SELECT id, name, image, image_small, cooking_time,
+           EXISTS (SELECT 1 FROM changed)
+    FROM {recipes} WHERE id = %(recipe_id)s
+'''
+REMOVE = '''
+    WITH changed AS (
+        DELETE FROM {table}
+        WHERE user_id = %(user_id)s AND recipe_id = %(recipe_id)s
+        RETURNING recipe_id
+    ),
+    counter AS (
+        UPDATE {recipes} SET {counter} = {counter} - 1
+        WHERE id IN (SELECT recipe_id FROM changed)
+    ){extra}
+    SELECT recipe_id FROM changed
+'''
+
+
+def _execute(template, model, user_id, recipe_id, extra):
+    counter = TRACKED[model]
+    sql = template.format(
+        table=model._meta.db_table, recipes=RECIPES, counter=counter,
+        extra=f',{extra}' if extra else ''
+    )
+    locked = model in SHOPPING_LIST_CTE
+    # Само выражение атомарно; транзакция нужна для блокировки рецепта,
+    # а точка сохранения внутри внешней транзакции — чтобы пережить
+    # IntegrityError.
+    savepoint = (transaction.atomic()
+                 if locked or connection.in_atomic_block else nullcontext())
+    with savepoint, connection.cursor() as cursor:
+        if locked:
+            lock_recipes([recipe_id])
+        cursor.execute(sql, {'user_id': user_id, 'recipe_id': recipe_id})
+        return cursor.fetchone()
+
+
+def add_recipe(model, user_id, recipe_id):
+    """Добавляет рецепт пользователю.
+
+    Возвращает (рецепт, добавлен ли сейчас); рецепт None, если его нет.
+    """
+    extra = SHOPPING_LIST_CTE.get(model, ('', ''))[0]
+    try:
+        row = _execute(ADD, model, user_id, recipe_id, extra)
+    except IntegrityError:
+        # Рецепт удалили между проверкой и вставкой.
+        return None, False
+    if row is None:
+        return None, False
+    *fields, added = row
+    if added:
+        invalidate_membership(user_id)
+    return Recipe(**dict(zip(RECIPE_FIELDS, fields))), added
+
+
+def remove_recipe(model, user_id, recipe_id):
+    """Убирает рецепт у пользователя; False, если его там не было."""
+    extra = SHOPPING_LIST_CTE.get(model, ('', ''))[1]
+    removed = _execute(REMOVE, model, user_id, recipe_id, extra) is not None
+    if removed:
+        invalidate_membership(user_id)
+    return removed
@@ -28,16 +28,18 @@ def recipe_validator(value):
         raise ValidationError(
             'Теги не должны повторяться.'
         )
-    ing_list = []
-    for ingredient in ingredients:
-        ing_id = ingredient.get('id')
-        if ing_id in ing_list:
+    ing_ids = [ingredient.get('id') for ingredient in ingredients]
+    existing = set(Ingredients.objects.filter(
+        id__in=set(ing_ids)
+    ).values_list('id', flat=True))
+    seen = set()
+    for ing_id, ingredient in zip(ing_ids, ingredients):
+        if ing_id in seen:
             raise ValidationError(
                 'Ингредиенты не должны повторяться.'
             )
-        else:
-            ing_list.append(ing_id)
-        if not Ingredients.objects.filter(id=ing_id).exists():
+        seen.add(ing_id)
+        if ing_id not in existing:
             raise ValidationError(f'Ингредиент с id {ing_id} не существует.')
         if ingredient['amount'] < 1:
             raise ValidationError('Колличество ингредиента не может быть '
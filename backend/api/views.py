@@ -1,4 +1,6 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Exists, F, OuterRef
 from django.http import HttpResponse
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
@@ -10,26 +12,64 @@ from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from .models import (Favorite, Ingredients, IngredientsRecipe, Recipe,
-                     ShoppingCart, Tags)
+from .autocomplete import get_index
+from .bulk import add_recipes, remove_recipes
+from .cache import cached_response, detail_key, get_tag_ids, list_key
+from .conditional import conditional_response, get_object_version, get_version
+from .exports import EXPORTS, ExportNegotiation, export_response
+from .membership import get_membership
+from .models import (SEARCH_CONFIG, Favorite, Ingredients, Recipe,
+                     ShoppingCart, ShoppingListItem, Tags, TagsRecipe)
+from .pagination import RecipeCursorPagination
+from .payloads import get_payload, payload_response
 from .permissions import IsAdminOrReadOnly, IsAuthor
-from .serializers import (FavoriteSerializer, IngredientsSerializer,
+from .serializers import (BulkRecipesSerializer, IngredientsSerializer,
                           RecipeReadSerializer, RecipeSerializer,
-                          ShoppingSerializer, TagsSerializer)
+                          RecipeShortSerializer, TagsSerializer)
+from .units import get_table
+from .user_recipes import add_recipe, remove_recipe
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+class TagsFilter(filters.MultipleChoiceFilter):
+    """Фильтр по слагам тегов.
+
+    Допустимые слаги берутся из кеша, а рецепты отбираются через EXISTS,
+    поэтому каждый рецепт попадает в выдачу один раз.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('choices', tag_choices)
+        kwargs.setdefault('distinct', False)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        tag_ids = get_tag_ids()
+        return qs.filter(Exists(TagsRecipe.objects.filter(
+            recipe=OuterRef('pk'),
+            tags_id__in=[tag_ids[slug] for slug in value if slug in tag_ids]
+        )))
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagsFilter()
     is_favorited = filters.BooleanFilter(
         method="filter_is_favorited"
     )
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart"
     )
+    search = filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Recipe
-        fields = ("tags", "author", "is_favorited", "is_in_shopping_cart")
+        fields = ("tags", "author", "is_favorited", "is_in_shopping_cart",
+                  "search")
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request and self.request.user.is_authenticated:
@@ -41,6 +81,13 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        query = SearchQuery(value, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', 'created_at', 'id')
+
 
 class IngredientFilter(FilterSet):
 
@@ -55,10 +102,64 @@ class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для работы с рецептами."""
 
     queryset = Recipe.objects.all()
+    permission_classes = (AllowAny,)
     pagination_class = LimitOffsetPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.for_read(self.request.user)
+        return super().get_queryset()
+
+    def get_personal_version(self, request):
+        if not request.user.is_authenticated:
+            return None
+        return tuple(
+            sorted(ids) for ids in get_membership(request.user).values()
+        )
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            get_version(self.filter_queryset(Recipe.objects.all())),
+            lambda: cached_response(
+                request, list_key(request),
+                lambda: super(RecipeViewSet, self).list(
+                    request, *args, **kwargs
+                )
+            ),
+            personal=self.get_personal_version(request)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_field]
+        return conditional_response(
+            request,
+            get_object_version(Recipe.objects.all(), pk),
+            lambda: cached_response(
+                request, detail_key(request, pk),
+                lambda: super(RecipeViewSet, self).retrieve(
+                    request, *args, **kwargs
+                ),
+                many=False
+            ),
+            personal=self.get_personal_version(request),
+            single=True
+        )
+
+    @property
+    def paginator(self):
+        """Курсорная пагинация включается параметром pagination=cursor."""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if (params.get('pagination') == 'cursor'
+                    or RecipeCursorPagination.cursor_query_param in params):
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
@@ -69,7 +170,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return (IsAuthenticated(),)
         if self.action in ['destroy', 'update', 'partial_update']:
             return (IsAuthor(),)
-        return (AllowAny(),)
+        return super().get_permissions()
 
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
@@ -83,43 +184,45 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Рецепт не найден.'},
                             status=status.HTTP_404_NOT_FOUND)
 
+    def user_recipe_response(self, request, pk, model, exists_message):
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            recipe_id = None
+        if request.method == 'POST':
+            recipe, added = (add_recipe(model, request.user.id, recipe_id)
+                             if recipe_id else (None, False))
+            if recipe is None:
+                return Response(
+                    {'error': 'Данного рецепта не существует.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            if not added:
+                return Response({'non_field_errors': [exists_message]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response(
+                RecipeShortSerializer(recipe,
+                                      context={'request': request}).data,
+                status=status.HTTP_201_CREATED
+            )
+        if recipe_id and remove_recipe(model, request.user.id, recipe_id):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if not recipe_id or not Recipe.objects.filter(id=recipe_id).exists():
+            return Response(
+                {'error': 'Данного рецепта не существует.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({"error": "Подписки не существует"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
         permission_classes=[IsAuthenticated, ],
     )
     def favorite(self, request, pk):
-        if not Recipe.objects.filter(id=pk).exists():
-            return Response(
-                {'error': 'Данного рецепта не существует.'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        if not request.user.is_authenticated:
-            return Response(
-                {'error': 'Вы должны быть аутентифицированы для добавления в '
-                 'избранное.'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        recipe = Recipe.objects.get(id=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        serializer = FavoriteSerializer(data=data,
-                                        context={'request': request})
-        if request.method == 'POST':
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        favorite = Favorite.objects.filter(
-            recipe=recipe,
-            user=request.user
-        )
-        if not favorite:
-            return Response({"error": "Подписки не существует"},
-                            status=status.HTTP_400_BAD_REQUEST)
-        favorite.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.user_recipe_response(request, pk, Favorite,
+                                         'Рецепт в избранном')
 
     @action(
         detail=True,
@@ -127,69 +230,71 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated, ],
     )
     def shopping_cart(self, request, pk):
-        if not Recipe.objects.filter(id=pk).exists():
-            return Response(
-                {'error': 'Данного рецепта не существует.'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        if not request.user.is_authenticated:
-            return Response(
-                {'error': 'Вы должны быть аутентифицированы для добавления в '
-                 'избранное.'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        recipe = Recipe.objects.get(id=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        serializer = ShoppingSerializer(data=data,
-                                        context={'request': request})
-        if request.method == 'POST':
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        favorite = ShoppingCart.objects.filter(
-            recipe=recipe,
-            user=request.user
+        return self.user_recipe_response(request, pk, ShoppingCart,
+                                         'Рецепт в списке покупок')
+
+    def bulk_response(self, request, model):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = add_recipes if request.method == 'POST' else remove_recipes
+        return Response(
+            {'results': change(model, request.user.id,
+                               serializer.validated_data['ids'])},
+            status=status.HTTP_200_OK
         )
-        if not favorite:
-            return Response({"error": "Подписки не существует"},
-                            status=status.HTTP_400_BAD_REQUEST)
-        favorite.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @staticmethod
-    def ingredients_in_file(ingredients):
-        text = ''
-        for ingredient in ingredients:
-            text += (
-                f"{ingredient['ingredients__name']} "
-                f"({ingredient['ingredients__measurement_unit']}) - "
-                f"{ingredient['sum']}\n"
-            )
-        return text
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite/bulk',
+        permission_classes=[IsAuthenticated, ],
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_response(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart/bulk',
+        permission_classes=[IsAuthenticated, ],
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_response(request, ShoppingCart)
 
     @action(
         methods=['GET', ],
         detail=False,
-        permission_classes=[IsAuthenticated, ]
+        permission_classes=[IsAuthenticated, ],
+        content_negotiation_class=ExportNegotiation
     )
     def download_shopping_cart(self, request):
-        user = request.user
-        ingredients = IngredientsRecipe.objects.filter(
-            recipe__shopping_cart__user=user
-        ).values(
-            'ingredients__name', 'ingredients__measurement_unit'
-        ).annotate(sum=Sum('amount')).order_by('ingredients__name')
-        if not ingredients.exists():
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in EXPORTS:
+            return Response(
+                {'error': f'Формат {export_format} не поддерживается.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        items = list(ShoppingListItem.objects.filter(
+            user=request.user
+        ).values_list('ingredient_id', 'total_amount'))
+        if not items:
             return HttpResponse("Вы ничего не добавляли в список покупок",
                                 content_type='text/plain')
-        shopping_cart = self.ingredients_in_file(ingredients)
-        return HttpResponse(shopping_cart, content_type='text/plain')
+        ingredient_ids, amounts = zip(*items)
+        return export_response(
+            export_format, get_table().aggregate(ingredient_ids, amounts)
+        )
 
 
-class IngredientsViewSet(viewsets.ModelViewSet):
+class ReferenceViewSetMixin:
+    """Общее для вьюсетов справочников с готовыми ответами."""
+
+    @staticmethod
+    def is_json(request):
+        return request.accepted_renderer.format == 'json'
+
+
+class IngredientsViewSet(ReferenceViewSetMixin, viewsets.ModelViewSet):
     """Вьюсет для работы с ингредиентами."""
 
     queryset = Ingredients.objects.all()
@@ -198,13 +303,50 @@ class IngredientsViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def get_search_limit(self, request):
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            return settings.INGREDIENT_SEARCH_LIMIT
+        return max(1, min(limit, settings.INGREDIENT_SEARCH_MAX_LIMIT))
+
     def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            index = get_index()
+            return conditional_response(
+                request,
+                {'last_modified': None, 'count': index.version},
+                lambda: Response(
+                    index.search(name, self.get_search_limit(request))
+                )
+            )
+        if not request.query_params and self.is_json(request):
+            return payload_response(request, get_payload(
+                'ingredients', lambda: self.get_serializer(
+                    self.get_queryset(), many=True
+                ).data
+            ))
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+
+        def build():
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+
+        return conditional_response(request, get_version(queryset), build)
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            get_object_version(self.get_queryset(), kwargs['pk']),
+            lambda: super(IngredientsViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            single=True
+        )
 
 
-class TagsViewSet(viewsets.ModelViewSet):
+class TagsViewSet(ReferenceViewSetMixin, viewsets.ModelViewSet):
     """Вьюсет для работы с тегами."""
 
     queryset = Tags.objects.all()
@@ -213,5 +355,24 @@ class TagsViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        if self.is_json(request):
+            return payload_response(request, get_payload(
+                'tags',
+                lambda: self.get_serializer(queryset, many=True).data
+            ))
+
+        def build():
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+
+        return conditional_response(request, get_version(queryset), build)
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            get_object_version(self.get_queryset(), kwargs['pk']),
+            lambda: super(TagsViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            single=True
+        )
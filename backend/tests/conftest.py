@@ -0,0 +1,158 @@
+import base64
+import io
+import threading
+from contextlib import contextmanager
+
+import pytest
+from api.models import Ingredients, IngredientsRecipe, Recipe, Tags
+from django.core.cache import cache
+from django.db import connection
+from PIL import Image
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path / 'media'
+    return settings.MEDIA_ROOT
+
+
+@pytest.fixture(autouse=True)
+def no_thumbnails(monkeypatch):
+    # Миниатюры не делаются: страницы должны быть верны и без них.
+    monkeypatch.setattr('api.signals.schedule', lambda *args: None)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def committed(django_capture_on_commit_callbacks):
+    """Выполняет колбэки on_commit блока, как после фиксации.
+
+    В отличие от execute=True выполняет и колбэки, которые добавили
+    сами колбэки: в режиме автокоммита они срабатывают сразу.
+    """
+    @contextmanager
+    def commit():
+        with django_capture_on_commit_callbacks() as callbacks:
+            yield
+        while callbacks:
+            with django_capture_on_commit_callbacks() as added:
+                for callback in callbacks:
+                    callback()
+            callbacks = added
+
+    return commit
+
+
+def image_data(color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def image_uri(color='red'):
+    return ('data:image/png;base64,'
+            + base64.b64encode(image_data(color)).decode())
+
+
+def create_user(username):
+    return User.objects.create(
+        username=username, email=f'{username}@foodgram.ru',
+        first_name=username, last_name=username
+    )
+
+
+@pytest.fixture
+def user(db):
+    return create_user('reader')
+
+
+@pytest.fixture
+def author(db):
+    return create_user('author')
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [Tags.objects.create(name=f'Тег {i}', slug=f'tag{i}')
+            for i in range(2)]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [Ingredients.objects.create(name=f'Ингредиент {i}',
+                                       measurement_unit='г')
+            for i in range(5)]
+
+
+def create_recipe(author, tags, ingredients, name='Рецепт', amount=100):
+    recipe = Recipe.objects.create(author=author, name=name, text='Текст',
+                                   cooking_time='10')
+    recipe.tags.set(tags)
+    IngredientsRecipe.objects.bulk_create(
+        IngredientsRecipe(recipe=recipe, ingredients=ingredient,
+                          amount=amount)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+@pytest.fixture
+def recipes(author, tags, ingredients):
+    return [create_recipe(author, tags, ingredients, name=f'Рецепт {i}')
+            for i in range(12)]
+
+
+@pytest.fixture
+def follow(user, author):
+    return Follow.objects.create(user=user, following=author)
+
+
+def run_concurrently(target, count):
+    """Запускает target(i) в count потоках одновременно.
+
+    У каждого потока своё соединение с базой; результаты в порядке i.
+    """
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        try:
+            barrier.wait()
+            results[index] = target(index)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(index,))
+               for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
@@ -0,0 +1,75 @@
+import pytest
+from api.models import Recipe, ShoppingCart, ShoppingListItem
+from api.shopping_list import find_mismatches
+from rest_framework.test import APIClient
+
+from .conftest import create_recipe, create_user, run_concurrently
+
+URL = '/api/recipes/shopping_cart/bulk/'
+THREADS = 8
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_bulk_add_counts_each_recipe_once(tags, ingredients):
+    author = create_user('author')
+    user = create_user('reader')
+    recipes = [create_recipe(author, tags, ingredients, name=f'Рецепт {i}',
+                             amount=700)
+               for i in range(3)]
+    ids = [recipe.id for recipe in recipes]
+
+    def add(index):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(URL, {'ids': ids}, format='json')
+
+    responses = run_concurrently(add, THREADS)
+    assert all(response.status_code == 200 for response in responses)
+    for recipe_id in ids:
+        statuses = [
+            result['status']
+            for response in responses
+            for result in response.data['results']
+            if result['id'] == recipe_id
+        ]
+        assert statuses.count('added') == 1
+        assert statuses.count('exists') == THREADS - 1
+    assert ShoppingCart.objects.filter(user=user).count() == len(ids)
+    assert set(Recipe.objects.values_list('cart_count', flat=True)) == {1}
+    assert set(ShoppingListItem.objects.filter(user=user).values_list(
+        'total_amount', flat=True
+    )) == {700 * len(ids)}
+    assert find_mismatches() == []
+
+
+@pytest.mark.django_db
+def test_bulk_statuses(user_client, recipes):
+    ids = [recipe.id for recipe in recipes[:3]]
+    user_client.post(URL, {'ids': ids[:1]}, format='json')
+    response = user_client.post(URL, {'ids': ids + [10 ** 6]}, format='json')
+    assert response.status_code == 200
+    assert [result['status'] for result in response.data['results']] == [
+        'exists', 'added', 'added', 'not_found'
+    ]
+    response = user_client.delete(URL, {'ids': ids[:2]}, format='json')
+    assert [result['status'] for result in response.data['results']] == [
+        'removed', 'removed'
+    ]
+    assert find_mismatches() == []
+
+
+@pytest.mark.parametrize('method', ['post', 'delete'])
+@pytest.mark.parametrize('ids', [[0], [2 ** 63], [1, 10 ** 20]])
+def test_bulk_rejects_ids_outside_bigint(user_client, method, ids):
+    response = getattr(user_client, method)(URL, {'ids': ids},
+                                            format='json')
+    assert response.status_code == 400
+    assert 'ids' in response.data
+
+
+@pytest.mark.parametrize('method', ['post', 'delete'])
+def test_bulk_accepts_largest_bigint(user_client, method):
+    response = getattr(user_client, method)(URL, {'ids': [2 ** 63 - 1]},
+                                            format='json')
+    assert response.status_code == 200
+    assert response.data['results'][0]['status'] == 'not_found'
@@ -0,0 +1,102 @@
+import io
+
+import pytest
+from api.cache import get_stats
+from api.models import IngredientsRecipe, Recipe
+from django.core.management import call_command
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from .conftest import create_recipe, create_user, image_uri, run_concurrently
+
+URL = '/api/recipes/'
+
+
+def cache_status(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response['X-Cache']
+
+
+@pytest.mark.django_db
+def test_change_purges_only_pages_with_recipe(
+    client, recipes, committed
+):
+    first_page, last_page = f'{URL}?limit=3', f'{URL}?limit=3&offset=9'
+    detail = f'{URL}{recipes[0].id}/'
+    for url in (first_page, last_page, detail):
+        assert cache_status(client, url) == 'MISS'
+        assert cache_status(client, url) == 'HIT'
+
+    with committed():
+        IngredientsRecipe.objects.filter(recipe=recipes[-1]).first().save()
+    assert cache_status(client, first_page) == 'HIT'
+    assert cache_status(client, detail) == 'HIT'
+    assert cache_status(client, last_page) == 'MISS'
+
+
+@pytest.mark.django_db
+def test_created_recipe_appears_with_ingredients(
+    client, author_client, recipes, tags, ingredients,
+    committed
+):
+    url = f'{URL}?limit=20'
+    assert cache_status(client, url) == 'MISS'
+    with committed():
+        response = author_client.post(URL, {
+            'name': 'Новый', 'text': 'Текст', 'cooking_time': 10,
+            'tags': [tag.id for tag in tags],
+            'ingredients': [{'id': ingredients[0].id, 'amount': 5}],
+            'image': image_uri(),
+        }, format='json')
+    assert response.status_code == 201
+    results = client.get(url).data['results']
+    assert len(results) == len(recipes) + 1
+    assert [row['ingredients'] for row in results
+            if row['name'] == 'Новый'][0][0]['amount'] == 5
+
+
+@pytest.mark.django_db(transaction=True)
+def test_page_cached_before_commit_is_not_served(tags, ingredients):
+    recipe = create_recipe(create_user('author'), tags, ingredients)
+    client = APIClient()
+    for url in (URL, f'{URL}{recipe.id}/'):
+        with transaction.atomic():
+            Recipe.objects.filter(id=recipe.id).update(name='Старое')
+            recipe.refresh_from_db()
+        with transaction.atomic():
+            recipe.name = 'Новое'
+            recipe.save()
+            # Параллельный запрос видит ещё не зафиксированное состояние
+            # и кеширует его.
+            response, = run_concurrently(lambda index: client.get(url), 1)
+            assert 'Старое' in response.content.decode()
+        assert 'Новое' in client.get(url).content.decode()
+
+
+@pytest.mark.django_db
+def test_renamed_recipe_appears_in_cached_search(client, recipes, committed):
+    url = f'{URL}?search=пирог'
+    assert cache_status(client, url) == 'MISS'
+    assert cache_status(client, url) == 'HIT'
+    assert client.get(url).data['count'] == 0
+
+    with committed():
+        recipes[5].name = 'Яблочный пирог'
+        recipes[5].save()
+    response = client.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert [row['id'] for row in response.data['results']] == [recipes[5].id]
+
+
+@pytest.mark.django_db
+def test_cache_stats_command(client, recipes):
+    for _ in range(3):
+        cache_status(client, URL)
+    output, errors = io.StringIO(), io.StringIO()
+    call_command('cache_stats', '--reset', stdout=output, stderr=errors)
+    assert 'Попаданий: 2, промахов: 1, доля попаданий: 66.7%' in (
+        output.getvalue()
+    )
+    assert 'LocMemCache' in errors.getvalue()
+    assert get_stats() == {'hit': 0, 'miss': 0}
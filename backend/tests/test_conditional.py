@@ -0,0 +1,80 @@
+import pytest
+from api.models import Recipe
+
+URL = '/api/recipes/'
+
+
+@pytest.mark.django_db
+def test_recipe_list_changes_after_delete(client, recipes, committed):
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response
+    etag = response['ETag']
+    assert client.get(URL, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    with committed():
+        Recipe.objects.filter(id=recipes[0].id).delete()
+    assert client.get(
+        URL, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+    ).status_code == 200
+    response = client.get(URL, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data['count'] == len(recipes) - 1
+    assert response['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_recipe_detail_last_modified(client, recipes):
+    url = f'{URL}{recipes[0].id}/'
+    response = client.get(url)
+    assert response.status_code == 200
+    last_modified = response['Last-Modified']
+    assert client.get(
+        url, HTTP_IF_MODIFIED_SINCE=last_modified
+    ).status_code == 304
+
+
+@pytest.mark.django_db
+def test_author_change_updates_recipe_versions(
+    client, author_client, author, recipes, committed
+):
+    url = f'{URL}{recipes[0].id}/'
+    etags = {}
+    for page in (url, URL):
+        response = client.get(page)
+        assert response['X-Cache'] == 'MISS'
+        etags[page] = response['ETag']
+
+    with committed():
+        response = author_client.patch(
+            f'/api/users/{author.id}/', {'first_name': 'Новое'}
+        )
+    assert response.status_code == 200
+    for page in (url, URL):
+        response = client.get(page, HTTP_IF_NONE_MATCH=etags[page])
+        assert response.status_code == 200
+        assert response['X-Cache'] == 'MISS'
+        etags[page] = response['ETag']
+    assert response.data['results'][0]['author']['first_name'] == 'Новое'
+
+    with committed():
+        author.last_name = 'Новая'
+        author.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+    assert response.status_code == 200
+    assert response.data['author']['last_name'] == 'Новая'
+
+
+@pytest.mark.django_db
+def test_other_user_fields_keep_recipe_versions(
+    client, author, recipes, committed
+):
+    url = f'{URL}{recipes[0].id}/'
+    etag = client.get(url)['ETag']
+    with committed():
+        author.save(update_fields=['last_login'])
+        author.is_active = True
+        author.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert client.get(url)['X-Cache'] == 'HIT'
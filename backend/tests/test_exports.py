@@ -0,0 +1,110 @@
+import csv
+import io
+import re
+
+import pytest
+from api.exports import (PDF_LINES_PER_PAGE, export_csv, export_pdf,
+                         export_response, export_txt)
+
+ROWS = [
+    ('Мука', 'кг', 2),
+    ('Молоко', 'л', 1.28),
+    ('Соль, морская', 'г', 5),
+    ('Сыр "Российский"', 'г', 200),
+]
+
+
+def pdf_objects(data):
+    """Объекты PDF по таблице xref; заодно проверяет саму таблицу."""
+    start = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    assert data[start:].startswith(b'xref\n')
+    size = int(re.search(rb'/Size (\d+)', data[start:]).group(1))
+    entries = data[start:].split(b'\n')[2:2 + size]
+    assert entries[0] == b'0000000000 65535 f '
+    objects = {}
+    for number, entry in enumerate(entries[1:], 1):
+        offset, generation, kind = entry.split()
+        assert (generation, kind) == (b'00000', b'n')
+        body = data[int(offset):]
+        header = f'{number} 0 obj\n'.encode()
+        assert body.startswith(header)
+        objects[number] = body[len(header):body.index(b'\nendobj\n')]
+    return objects
+
+
+def test_txt():
+    assert b''.join(export_txt(ROWS)).decode().splitlines() == [
+        'Мука (кг) - 2',
+        'Молоко (л) - 1.28',
+        'Соль, морская (г) - 5',
+        'Сыр "Российский" (г) - 200',
+    ]
+
+
+def test_csv_has_bom_and_header():
+    data = b''.join(export_csv(ROWS))
+    assert data.startswith('\ufeff'.encode())
+    rows = list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+    assert rows[0] == ['Ингредиент', 'Единица измерения', 'Количество']
+    assert rows[1:] == [[str(value) for value in row] for row in ROWS]
+
+
+@pytest.mark.parametrize('count', [0, 1, PDF_LINES_PER_PAGE - 2,
+                                   PDF_LINES_PER_PAGE - 1, 200])
+def test_pdf_xref_and_pages(count):
+    rows = [(f'Ингредиент {i}', 'г', i) for i in range(count)]
+    objects = pdf_objects(b''.join(export_pdf(rows)))
+    lines = count + 2
+    pages = -(-lines // PDF_LINES_PER_PAGE)
+    assert b'/Count %d' % pages in objects[2]
+    assert len(objects) == 3 + 2 * pages
+    streams = [
+        body for body in objects.values() if b'\nstream\n' in body
+    ]
+    assert len(streams) == pages
+    text = b''
+    for body in streams:
+        length = int(re.match(rb'<< /Length (\d+) >>', body).group(1))
+        content = body.split(b'\nstream\n', 1)[1]
+        assert content.endswith(b'\nendstream')
+        assert len(content) - len(b'\nendstream') == length
+        text += content
+    assert text.count(b') Tj T*') == lines
+    if count:
+        assert f'Ингредиент {count - 1} \\(г\\) - {count - 1}'.encode(
+            'cp1251'
+        ) in text
+
+
+def test_pdf_escapes_text():
+    data = b''.join(export_pdf([('Соус (острый) \\ чили', 'мл', 5)]))
+    assert 'Соус \\(острый\\) \\\\ чили'.encode('cp1251') in data
+    pdf_objects(data)
+
+
+def test_pdf_streams_before_reading_all_rows():
+    read = []
+
+    def rows():
+        for i in range(3 * PDF_LINES_PER_PAGE):
+            read.append(i)
+            yield (f'Ингредиент {i}', 'г', i)
+
+    chunks = export_pdf(rows())
+    for _ in range(4):
+        next(chunks)
+    assert len(read) < 3 * PDF_LINES_PER_PAGE
+
+
+@pytest.mark.parametrize('export_format, content_type', [
+    ('txt', 'text/plain; charset=utf-8'),
+    ('csv', 'text/csv; charset=utf-8'),
+    ('pdf', 'application/pdf'),
+])
+def test_export_response_headers(export_format, content_type):
+    response = export_response(export_format, iter(ROWS))
+    assert response['Content-Type'] == content_type
+    assert response['Content-Disposition'] == (
+        f'attachment; filename="shopping-list.{export_format}"'
+    )
+    assert b''.join(response.streaming_content)
@@ -0,0 +1,97 @@
+import base64
+import io
+
+import pytest
+from api import fields
+from api.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from .conftest import image_data
+
+PREFIX = 'data:image/png;base64,'
+
+
+def noise_png(size=(200, 200)):
+    # Шум плохо сжимается, поэтому строка длиннее нескольких кусков.
+    buffer = io.BytesIO()
+    Image.frombytes('L', size, bytes(
+        (i * 7919) % 251 for i in range(size[0] * size[1])
+    )).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ImageSerializer(serializers.Serializer):
+    image = Base64ImageField()
+
+
+def decode(uri):
+    serializer = ImageSerializer(data={'image': uri})
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['image']
+
+
+def error_code(uri):
+    serializer = ImageSerializer(data={'image': uri})
+    assert not serializer.is_valid()
+    error, = serializer.errors['image']
+    return error.code
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Не кратно 4, чтобы остатки переходили между кусками.
+    monkeypatch.setattr(fields, 'CHUNK_SIZE', 1001)
+
+
+@pytest.mark.parametrize('encode', [
+    lambda data: base64.b64encode(data).decode(),
+    lambda data: base64.encodebytes(data).decode(),
+    lambda data: base64.encodebytes(data).decode().replace('\n', '\r\n'),
+], ids=['plain', 'mime', 'crlf'])
+def test_decodes_plain_and_line_wrapped(small_chunks, encode):
+    data = noise_png()
+    upload = decode(PREFIX + encode(data))
+    assert upload.read() == data
+    assert upload.size == len(data)
+
+
+def test_too_large(settings):
+    data = noise_png()
+    settings.IMAGE_UPLOAD_MAX_SIZE = len(data) - 1
+    assert error_code(
+        PREFIX + base64.encodebytes(data).decode()
+    ) == 'too_large'
+    settings.IMAGE_UPLOAD_MAX_SIZE = len(data)
+    assert decode(PREFIX + base64.encodebytes(data).decode()).size == len(
+        data
+    )
+
+
+def test_large_upload_goes_to_disk(settings):
+    data = noise_png()
+    settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 1024
+    upload = decode(PREFIX + base64.b64encode(data).decode())
+    assert upload.temporary_file_path()
+    assert upload.read() == data
+
+
+def test_too_many_pixels(settings, small_chunks):
+    settings.IMAGE_UPLOAD_MAX_PIXELS = 200 * 200 - 1
+    assert error_code(
+        PREFIX + base64.b64encode(noise_png()).decode()
+    ) == 'too_many_pixels'
+
+
+@pytest.mark.parametrize('uri, code', [
+    ('data:image/png,' + base64.b64encode(image_data()).decode(),
+     'invalid_image'),
+    (PREFIX + '!!!!' + base64.b64encode(image_data()).decode(),
+     'invalid_image'),
+    (PREFIX + base64.b64encode(image_data()).decode()[:-1],
+     'invalid_image'),
+    (PREFIX + base64.b64encode(b'not an image').decode(), 'invalid_image'),
+    (PREFIX, 'empty'),
+], ids=['no-marker', 'bad-chars', 'bad-length', 'not-image', 'empty'])
+def test_malformed_uri(uri, code):
+    assert error_code(uri) == code
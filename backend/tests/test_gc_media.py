@@ -0,0 +1,101 @@
+import io
+import os
+import time
+
+import pytest
+from api.models import MediaFile, Recipe
+from api.thumbnails import thumbnail_name
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+
+from .conftest import image_data
+
+OLD = time.time() - 2 * 3600
+QUARANTINED = 'quarantine/recipes/images/00/earlier.png'
+
+
+def write(root, name, mtime=OLD):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'data')
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def files(root):
+    return sorted(
+        str(path.relative_to(root)) for path in root.rglob('*')
+        if path.is_file()
+    )
+
+
+@pytest.fixture
+def media(media_root, recipes, author):
+    """Картинки со ссылками, сироты и каталог карантина в MEDIA_ROOT."""
+    recipe = recipes[0]
+    recipe.image.save('image.png', ContentFile(image_data()))
+    Recipe.objects.filter(id=recipe.id).update(
+        image_small=thumbnail_name(recipe.image.name)
+    )
+    author.avatar.save('avatar.png', ContentFile(image_data('blue')))
+    referenced = [recipe.image.name, thumbnail_name(recipe.image.name),
+                  author.avatar.name]
+    for name in referenced:
+        write(media_root, name)
+    orphans = ['recipes/images/00/orphan.png', 'old.png']
+    for name in orphans:
+        write(media_root, name)
+    MediaFile.objects.create(name=orphans[0], ref_count=0)
+    write(media_root, 'recipes/images/00/young.png', mtime=time.time())
+    write(media_root, QUARANTINED)
+    return {
+        'referenced': referenced,
+        'orphans': orphans,
+        'all': files(media_root),
+    }
+
+
+def gc_media(*args):
+    call_command('gc_media', *args, stdout=io.StringIO())
+
+
+@pytest.mark.django_db
+def test_removes_only_old_unreferenced_files(media_root, media):
+    gc_media('--quarantine', str(media_root / 'quarantine'))
+    assert files(media_root) == sorted(
+        set(media['all']) - set(media['orphans'])
+        | {f'quarantine/{name}' for name in media['orphans']}
+    )
+    assert not MediaFile.objects.filter(name__in=media['orphans']).exists()
+    assert MediaFile.objects.filter(
+        name__in=media['referenced']
+    ).count() == 2
+
+
+@pytest.mark.django_db
+def test_deletes_without_quarantine(media_root, media):
+    gc_media('--batch-size', '1')
+    remaining = files(media_root)
+    assert remaining == sorted(
+        set(media['all']) - set(media['orphans']) - {QUARANTINED}
+    )
+    assert 'recipes/images/00/young.png' in remaining
+    assert not MediaFile.objects.filter(name__in=media['orphans']).exists()
+
+
+@pytest.mark.django_db
+def test_min_age_keeps_recent_files(media_root, media):
+    gc_media('--min-age', str(3 * 3600))
+    assert files(media_root) == media['all']
+
+
+@pytest.mark.django_db
+def test_dry_run_touches_nothing(media_root, media):
+    rows = list(MediaFile.objects.values_list('name', 'ref_count'))
+    output = io.StringIO()
+    call_command('gc_media', '--dry-run', '--verbose-files', stdout=output)
+    assert files(media_root) == media['all']
+    assert list(MediaFile.objects.values_list('name', 'ref_count')) == rows
+    assert output.getvalue().splitlines()[:-1] == sorted(
+        media['orphans'] + [QUARANTINED]
+    )
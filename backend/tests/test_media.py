@@ -0,0 +1,110 @@
+import os
+
+import pytest
+from api.models import MediaFile
+from api.storage import content_addressed_storage
+from django.core.files.base import ContentFile
+
+from .conftest import image_data, image_uri, run_concurrently
+
+
+def ref_counts():
+    return dict(MediaFile.objects.values_list('name', 'ref_count'))
+
+
+@pytest.mark.django_db
+def test_same_image_upload_keeps_one_reference(
+    author_client, tags, ingredients, committed
+):
+    data = {
+        'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 10,
+        'tags': [tag.id for tag in tags],
+        'ingredients': [{'id': ingredients[0].id, 'amount': 10}],
+        'image': image_uri(),
+    }
+    recipe_id = author_client.post('/api/recipes/', data,
+                                   format='json').data['id']
+    with committed():
+        response = author_client.patch(f'/api/recipes/{recipe_id}/', data,
+                                       format='json')
+    assert response.status_code == 200
+    (name, count), = ref_counts().items()
+    assert count == 1
+    with committed():
+        author_client.delete(f'/api/recipes/{recipe_id}/')
+    assert ref_counts() == {}
+    assert not content_addressed_storage.exists(name)
+
+
+@pytest.mark.django_db
+def test_same_avatar_upload_keeps_one_reference(
+    user, user_client, committed
+):
+    for _ in range(2):
+        with committed():
+            response = user_client.put('/api/users/me/avatar/',
+                                       {'avatar': image_uri('blue')},
+                                       format='json')
+        assert response.status_code == 200
+    user.refresh_from_db()
+    assert ref_counts() == {user.avatar.name: 1}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_identical_saves_share_hash_name():
+    data = image_data()
+    names = run_concurrently(
+        lambda index: content_addressed_storage.save(
+            f'upload{index}.png', ContentFile(data)
+        ),
+        8
+    )
+    assert len(set(names)) == 1
+    name, = set(names)
+    assert ref_counts() == {name: 8}
+    directory = os.path.dirname(content_addressed_storage.path(name))
+    assert os.listdir(directory) == [os.path.basename(name)]
+
+
+@pytest.mark.django_db
+def test_save_after_lost_exists_race_keeps_hash_name(monkeypatch):
+    data = image_data()
+    name = content_addressed_storage.save('first.png', ContentFile(data))
+    # Второй запрос проверил наличие файла до того, как первый его записал.
+    exists = type(content_addressed_storage).exists
+    checked = []
+
+    def exists_before_write(self, path):
+        if path == name and not checked:
+            checked.append(path)
+            return False
+        return exists(self, path)
+
+    monkeypatch.setattr(type(content_addressed_storage), 'exists',
+                        exists_before_write)
+    assert content_addressed_storage.save(
+        'second.png', ContentFile(data)
+    ) == name
+    assert ref_counts() == {name: 2}
+    directory = os.path.dirname(content_addressed_storage.path(name))
+    assert os.listdir(directory) == [os.path.basename(name)]
+
+
+@pytest.mark.django_db
+def test_avatar_replaced_through_user_endpoint(
+    author, author_client, committed
+):
+    url = f'/api/users/{author.id}/'
+    for color in ('red', 'blue'):
+        with committed():
+            response = author_client.patch(
+                url, {'avatar': image_uri(color)}, format='json'
+            )
+        assert response.status_code == 200
+    author.refresh_from_db()
+    assert ref_counts() == {author.avatar.name: 1}
+    with committed():
+        response = author_client.patch(url, {'avatar': None},
+                                       format='json')
+    assert response.status_code == 200
+    assert ref_counts() == {}
@@ -0,0 +1,36 @@
+import pytest
+from api.membership import FAVORITES, SHOPPING_CART, get_membership
+from api.models import Favorite
+from django.db import transaction
+
+from .conftest import create_recipe, create_user, run_concurrently
+
+
+@pytest.mark.django_db
+def test_favorite_and_cart_reload_membership(user, user_client, recipes,
+                                             committed):
+    assert get_membership(user)[FAVORITES] == frozenset()
+    with committed():
+        user_client.post(f'/api/recipes/{recipes[0].id}/favorite/')
+        user_client.post(f'/api/recipes/{recipes[1].id}/favorite/')
+        user_client.post(f'/api/recipes/{recipes[2].id}/shopping_cart/')
+    membership = get_membership(user)
+    assert membership[FAVORITES] == {recipes[0].id, recipes[1].id}
+    assert membership[SHOPPING_CART] == {recipes[2].id}
+
+    with committed():
+        user_client.delete(f'/api/recipes/{recipes[0].id}/favorite/')
+    assert get_membership(user)[FAVORITES] == {recipes[1].id}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_membership_loaded_before_commit_is_not_served(tags, ingredients):
+    user = create_user('reader')
+    recipe = create_recipe(create_user('author'), tags, ingredients)
+    with transaction.atomic():
+        Favorite.objects.create(user=user, recipe=recipe)
+        # Другое соединение ещё не видит новую строку и кеширует
+        # множества без неё.
+        loaded, = run_concurrently(lambda index: get_membership(user), 1)
+        assert loaded[FAVORITES] == frozenset()
+    assert get_membership(user)[FAVORITES] == {recipe.id}
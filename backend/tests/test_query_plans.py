@@ -0,0 +1,52 @@
+import pytest
+from api.management.commands.explain_queries import Command
+from api.models import Recipe
+from django.core.management import CommandError, call_command
+from django.db import connection
+from users.models import Follow, User
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='EXPLAIN проверяется только на PostgreSQL.'
+)
+
+
+@pytest.fixture
+def workload(recipes, user, follow):
+    """Таблицы, где запросы первого пользователя выбирают малую долю строк.
+
+    Со статистикой по нескольким строкам, которые все подходят под
+    условие, планировщик справедливо предпочёл бы другой индекс, а
+    autovacuum может собрать её посреди прогона, поэтому она собирается
+    явно по данным, похожим на настоящие.
+    """
+    cooks = User.objects.bulk_create(
+        User(username=f'cook{i}', email=f'cook{i}@foodgram.ru')
+        for i in range(40)
+    )
+    Recipe.objects.bulk_create(
+        Recipe(author=cook, name=f'Блюдо {i}', text='Описание',
+               cooking_time='10')
+        for cook in cooks for i in range(50)
+    )
+    Follow.objects.bulk_create(
+        Follow(user=cook, following=following)
+        for cook in cooks for following in cooks[:10] if cook != following
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+@pytest.mark.django_db
+def test_hot_queries_use_indexes(workload):
+    call_command('explain_queries', '--strict')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('columns', [['search_vector'], ['author_id']])
+def test_missing_index_is_reported(workload, columns):
+    with connection.cursor() as cursor:
+        for name in Command.index_names(cursor, Recipe, columns):
+            cursor.execute(f'DROP INDEX {name}')
+    with pytest.raises(CommandError):
+        call_command('explain_queries', '--strict')
@@ -0,0 +1,46 @@
+import pytest
+from api.membership import get_membership
+from api.models import Favorite, ShoppingCart
+
+# Версия выборки, COUNT пагинатора, рецепты, авторы, теги, ингредиенты.
+LIST_QUERIES = 6
+# Версия рецепта, рецепт, автор, теги, ингредиенты.
+DETAIL_QUERIES = 5
+
+
+@pytest.fixture
+def personal(user, recipes, follow):
+    Favorite.objects.create(user=user, recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe=recipes[1])
+    # Множества пользователя грузятся один раз и дальше берутся из кеша.
+    get_membership(user)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('client_name', ['client', 'user_client'])
+@pytest.mark.parametrize('limit', [2, 10])
+def test_list_query_count(request, client_name, limit, recipes, personal,
+                          django_assert_num_queries):
+    client = request.getfixturevalue(client_name)
+    with django_assert_num_queries(LIST_QUERIES):
+        response = client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    assert len(response.data['results']) == limit
+    # Фильтр по избранному не кешируется, но стоит столько же.
+    with django_assert_num_queries(LIST_QUERIES):
+        response = client.get('/api/recipes/', {'limit': limit,
+                                                'is_in_shopping_cart': 0})
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('client_name', ['client', 'user_client'])
+def test_detail_query_count(request, client_name, recipes, personal,
+                            django_assert_num_queries):
+    client = request.getfixturevalue(client_name)
+    with django_assert_num_queries(DETAIL_QUERIES):
+        response = client.get(f'/api/recipes/{recipes[0].id}/')
+    assert response.status_code == 200
+    authenticated = client_name == 'user_client'
+    assert response.data['is_favorited'] is authenticated
+    assert response.data['author']['is_subscribed'] is authenticated
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+from api.bulk import add_recipes
+from api.models import IngredientsRecipe, ShoppingCart, TagsRecipe
+from api.shopping_list import find_mismatches
+from api.user_recipes import add_recipe
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .conftest import create_recipe, create_user, image_uri, run_concurrently
+
+TABLE = f'"{IngredientsRecipe._meta.db_table}"'
+
+
+def edit(client, recipe, tags, amounts):
+    with CaptureQueriesContext(connection) as context:
+        response = client.patch(f'/api/recipes/{recipe.id}/', {
+            'name': recipe.name, 'text': 'Текст', 'cooking_time': 10,
+            'tags': [tag.id for tag in tags],
+            'ingredients': [{'id': ingredient.id, 'amount': amount}
+                            for ingredient, amount in amounts],
+            'image': image_uri(),
+        }, format='json')
+    assert response.status_code == 200
+    writes = [
+        query['sql'].split()[0] for query in context.captured_queries
+        if TABLE in query['sql'].split('WHERE')[0]
+        and not query['sql'].startswith('SELECT')
+    ]
+    return writes, len(context)
+
+
+def rows(recipe):
+    return dict(IngredientsRecipe.objects.filter(recipe=recipe).values_list(
+        'ingredients_id', 'id'
+    ))
+
+
+@pytest.mark.django_db
+def test_amount_change_keeps_rows(author_client, recipes, tags,
+                                  ingredients):
+    recipe = recipes[0]
+    before = rows(recipe)
+    tag_rows = set(TagsRecipe.objects.filter(recipe=recipe).values_list(
+        'id', flat=True
+    ))
+    amounts = [(ingredient, 100) for ingredient in ingredients]
+    amounts[0] = (ingredients[0], 250)
+    writes, queries = edit(author_client, recipe, tags, amounts)
+    assert writes == ['UPDATE']
+    assert rows(recipe) == before
+    assert IngredientsRecipe.objects.get(id=before[ingredients[0].id]
+                                         ).amount == 250
+    assert set(TagsRecipe.objects.filter(recipe=recipe).values_list(
+        'id', flat=True
+    )) == tag_rows
+    assert find_mismatches() == []
+
+    # Все количества сразу — тот же один UPDATE и столько же запросов.
+    assert edit(author_client, recipe, tags, [
+        (ingredient, 300) for ingredient in ingredients
+    ]) == (['UPDATE'], queries)
+    assert rows(recipe) == before
+
+
+@pytest.mark.django_db
+def test_removal_deletes_only_removed_rows(author_client, recipes, tags,
+                                           ingredients):
+    recipe = recipes[0]
+    before = rows(recipe)
+    kept = ingredients[:-1]
+    writes, _ = edit(author_client, recipe, tags,
+                     [(ingredient, 100) for ingredient in kept])
+    assert writes == ['DELETE']
+    assert rows(recipe) == {
+        ingredient.id: before[ingredient.id] for ingredient in kept
+    }
+
+
+@pytest.mark.django_db
+def test_unchanged_edit_writes_no_rows(author_client, recipes, tags,
+                                       ingredients):
+    recipe = recipes[0]
+    amounts = [(ingredient, 100) for ingredient in ingredients]
+    writes, queries = edit(author_client, recipe, tags, amounts)
+    assert writes == []
+    # Повтор той же правки стоит столько же запросов.
+    assert edit(author_client, recipe, tags, amounts)[1] == queries
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('add', [
+    lambda recipe, user: add_recipe(ShoppingCart, user.id, recipe.id),
+    lambda recipe, user: add_recipes(ShoppingCart, user.id, [recipe.id]),
+], ids=['single', 'bulk'])
+def test_cart_add_during_edit_sees_new_amounts(tags, ingredients, add):
+    author = create_user('author')
+    reader = create_user('reader')
+    recipe = create_recipe(author, tags, ingredients, amount=100)
+    edited = threading.Event()
+
+    def run(index):
+        if index == 1:
+            edited.wait()
+            return add(recipe, reader)
+        client = APIClient()
+        client.force_authenticate(author)
+        with transaction.atomic():
+            edit(client, recipe, tags,
+                 [(ingredient, 250) for ingredient in ingredients])
+            edited.set()
+            # Добавление успевает начаться до фиксации правки.
+            time.sleep(0.5)
+
+    run_concurrently(run, 2)
+    assert ShoppingCart.objects.filter(user=reader, recipe=recipe).exists()
+    assert find_mismatches() == []
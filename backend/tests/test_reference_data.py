@@ -0,0 +1,28 @@
+import pytest
+from api.cache import bump_data_version, get_data_version
+from api.models import Ingredients
+from django.core.cache import cache
+
+
+@pytest.mark.django_db
+def test_data_version_never_repeats_after_clear(committed):
+    seen = {get_data_version('ingredients')}
+    with committed():
+        bump_data_version('ingredients')
+    seen.add(get_data_version('ingredients'))
+    cache.clear()
+    version = get_data_version('ingredients')
+    assert len(seen) == 2
+    assert version not in seen
+
+
+@pytest.mark.django_db
+def test_ingredient_search_sees_new_rows(client, ingredients, committed):
+    url = '/api/ingredients/'
+    response = client.get(url, {'name': 'соль'})
+    assert response.data == []
+    with committed():
+        salt = Ingredients.objects.create(name='Соль', measurement_unit='г')
+        Ingredients.objects.create(name='Соль морская', measurement_unit='г')
+    response = client.get(url, {'name': 'соль', 'limit': 1})
+    assert [row['id'] for row in response.data] == [salt.id]
@@ -0,0 +1,135 @@
+"""Замер полнотекстового поиска рецептов на синтетической базе.
+
+По умолчанию пропускается. Запуск на миллионе рецептов:
+
+    SEARCH_BENCHMARK_ROWS=1000000 pytest tests/test_search_benchmark.py -s
+
+Рецепты вставляются одним INSERT ... SELECT внутри тестовой транзакции
+и откатываются после замера. Названия и описания состоят из слов
+словаря на 65536 слов, так что слово встречается примерно в 13 * N /
+65536 рецептах; вдобавок в каждом описании одно из 256 частых слов.
+Замеряются оба запроса страницы списка: COUNT и первые 10 строк по
+рангу.
+"""
+import os
+import statistics
+import time
+
+import pytest
+from api.models import Recipe
+from api.views import RecipeFilter
+from django.db import connection
+
+from .conftest import create_user
+
+ROWS = int(os.getenv('SEARCH_BENCHMARK_ROWS', 0))
+LIMIT_MS = float(os.getenv('SEARCH_BENCHMARK_MS', 10))
+SYLLABLES = ['ка', 'ро', 'ми', 'ту', 'ле', 'за', 'бо', 'ни',
+             'су', 'па', 'ве', 'гу', 'до', 'ры', 'фе', 'ши']
+VOCABULARY = len(SYLLABLES) ** 4
+NAME_WORDS = 3
+TEXT_WORDS = 10
+RUNS = 5
+
+pytestmark = [
+    pytest.mark.skipif(not ROWS, reason='Задайте SEARCH_BENCHMARK_ROWS.'),
+    pytest.mark.skipif(connection.vendor != 'postgresql',
+                       reason='Поиск работает только на PostgreSQL.'),
+]
+
+
+def word(number, syllables=4):
+    return ''.join(SYLLABLES[number // len(SYLLABLES) ** power
+                             % len(SYLLABLES)] for power in range(syllables))
+
+
+def random_words(count, syllables=4):
+    """SQL-выражение из count случайных слов словаря.
+
+    Слово собирается из слогов: выбор из большого массива стоил бы его
+    разбора на каждое обращение.
+    """
+    syllable = (f'(%(syllables)s::text[])[1 + floor(random() * '
+                f'{len(SYLLABLES)})::int]')
+    return (f"array_to_string(ARRAY(SELECT "
+            f"{' || '.join([syllable] * syllables)} "
+            f"FROM generate_series(1, {count} + 0 * i)), ' ')")
+
+
+@pytest.fixture
+def synthetic_recipes(db):
+    authors = [create_user(f'cook{i}').id for i in range(100)]
+    index, = [index for index in Recipe._meta.indexes
+              if index.fields == ['search_vector']]
+    with connection.cursor() as cursor, \
+            connection.schema_editor(atomic=False) as editor:
+        # GIN-индекс дешевле построить заново, чем пополнять построчно.
+        editor.remove_index(Recipe, index)
+        cursor.execute('SELECT setseed(0.5)')
+        cursor.execute(f'''
+            WITH generated AS (
+                SELECT i, {random_words(NAME_WORDS)} AS name,
+                       {random_words(TEXT_WORDS)} || ' '
+                       || {random_words(1, syllables=2)} AS text
+                FROM generate_series(1, %(rows)s) i
+            )
+            INSERT INTO {Recipe._meta.db_table} (
+                author_id, name, text, cooking_time, image, image_small,
+                created_at, updated_at, favorites_count, cart_count,
+                search_vector
+            )
+            SELECT (%(authors)s::bigint[])[1 + i %% %(author_count)s],
+                   name, text, '10', '', '',
+                   now() - i * interval '1 second', now(), 0, 0,
+                   setweight(to_tsvector('russian', name), 'A')
+                   || setweight(to_tsvector('russian', text), 'B')
+            FROM generated
+        ''', {'syllables': SYLLABLES, 'rows': ROWS, 'authors': authors,
+              'author_count': len(authors)})
+        # Отложенные проверки внешних ключей не дают строить индекс.
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        editor.add_index(Recipe, index)
+        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+        cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+
+
+def search_page(term):
+    queryset = RecipeFilter(
+        data={'search': term}, queryset=Recipe.objects.all()
+    ).qs
+    started = time.perf_counter()
+    count = queryset.count()
+    ids = list(queryset.values_list('id', flat=True)[:10])
+    return (time.perf_counter() - started) * 1000, count, ids
+
+
+def measure(title, terms):
+    """Медиана времени страницы поиска по terms; печатает сводку."""
+    for term in terms:
+        search_page(term)
+    timings = []
+    matches = []
+    for _ in range(RUNS):
+        for term in terms:
+            elapsed, count, ids = search_page(term)
+            timings.append(elapsed)
+            matches.append(count)
+            assert len(ids) == min(count, 10)
+    assert max(matches) > 0
+    median = statistics.median(timings)
+    print(f'\n{title}: рецептов {ROWS}, запросов {len(timings)}, '
+          f'совпадений в среднем {statistics.mean(matches):.0f}; медиана '
+          f'{median:.2f} мс, p95 '
+          f'{statistics.quantiles(timings, n=20)[-1]:.2f} мс, '
+          f'максимум {max(timings):.2f} мс.')
+    return median
+
+
+def test_search_under_limit(synthetic_recipes):
+    terms = [word(number) for number in range(0, VOCABULARY, 4099)]
+    terms += [f'{first} {second}' for first, second in zip(terms, terms[1:])]
+    assert measure('Редкие слова', terms) < LIMIT_MS
+    # Частое слово есть в каждом 256-м рецепте. Ранжируются все
+    # совпадения, поэтому время растёт с их числом; оно только печатается.
+    measure('Частые слова', [word(number, syllables=2)
+                             for number in range(0, 256, 17)])
@@ -0,0 +1,72 @@
+import pytest
+from api.models import Recipe
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from users.models import Follow
+
+from .conftest import create_user
+
+URL = '/api/users/subscriptions/'
+
+
+@pytest.fixture
+def authors(user):
+    authors = [create_user(f'author{i}') for i in range(5)]
+    for author in authors:
+        Follow.objects.create(user=user, following=author)
+        for i in range(4):
+            Recipe.objects.create(author=author, name=f'{author} {i}',
+                                  text='Текст', cooking_time='10')
+    return authors
+
+
+@pytest.mark.parametrize('recipes_limit', [None, 0, 2])
+def test_subscriptions_query_count(user_client, authors,
+                                   django_assert_num_queries,
+                                   recipes_limit):
+    params = {'limit': 3}
+    if recipes_limit is not None:
+        params['recipes_limit'] = recipes_limit
+    with django_assert_num_queries(3):
+        response = user_client.get(URL, params)
+    assert response.status_code == 200
+    results = response.data['results']
+    assert [author['username'] for author in results] == [
+        'author0', 'author1', 'author2'
+    ]
+    for author in results:
+        assert author['is_subscribed'] is True
+        assert author['recipes_count'] == 4
+        expected = [f'{author["username"]} {i}' for i in range(4)]
+        assert [recipe['name'] for recipe in author['recipes']] == (
+            expected if recipes_limit is None else expected[:recipes_limit]
+        )
+
+
+def test_subscriptions_limit_per_author_only(user_client, authors):
+    # Рецепты автора без подписки не сдвигают нумерацию у подписок.
+    stranger = create_user('stranger')
+    Recipe.objects.create(author=stranger, name='Чужой', text='Текст',
+                          cooking_time='10')
+    response = user_client.get(URL, {'recipes_limit': 1})
+    assert response.status_code == 200
+    assert [
+        [recipe['name'] for recipe in author['recipes']]
+        for author in response.data['results']
+    ] == [[f'{author} 0'] for author in authors]
+
+
+def test_subscriptions_rank_only_page_authors(user_client, authors):
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.get(URL, {'limit': 2, 'offset': 1,
+                                         'recipes_limit': 1})
+    assert response.status_code == 200
+    page = [author['id'] for author in response.data['results']]
+    assert page == [authors[1].id, authors[2].id]
+    ranked_sql, = [
+        query['sql'].split(') AS ranked')[0]
+        for query in context.captured_queries
+        if 'ROW_NUMBER' in query['sql']
+    ]
+    assert f'IN ({page[0]}, {page[1]})' in ranked_sql
+    assert 'users_follow' not in ranked_sql
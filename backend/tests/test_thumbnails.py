@@ -0,0 +1,177 @@
+import io
+import threading
+from concurrent.futures import Future
+
+import pytest
+from api import thumbnails
+from api.imaging import render_webp
+from api.models import Recipe
+from api.signals import recipes_changed
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from PIL import Image
+
+from .conftest import image_data, image_uri
+
+
+def author_avatar(client, recipe):
+    response = client.get(f'/api/recipes/{recipe.id}/')
+    assert response.status_code == 200
+    return response['X-Cache'], response.data['author']['avatar']
+
+
+def finished(result=None, exception=None):
+    future = Future()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return future
+
+
+class QueueExecutor:
+    """Пул, задачи которого выполняются, только когда их ждут."""
+
+    def __init__(self):
+        self.queued = {}
+        self.most_queued = 0
+
+    def submit(self, function, *args):
+        future = Future()
+        self.queued[future] = (function, args)
+        self.most_queued = max(self.most_queued, len(self.queued))
+        return future
+
+    def run(self, futures):
+        for future in futures:
+            function, args = self.queued.pop(future)
+            try:
+                future.set_result(function(*args))
+            except Exception as error:
+                future.set_exception(error)
+        return set(futures), set()
+
+    def shutdown(self, wait=True):
+        assert not self.queued
+
+
+@pytest.fixture
+def recipe_with_image(recipes):
+    recipe = recipes[0]
+    recipe.image.save('image.png', ContentFile(image_data()))
+    return recipe
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = QueueExecutor()
+    monkeypatch.setattr(thumbnails, '_executor', executor)
+    monkeypatch.setattr(
+        'api.management.commands.make_thumbnails.wait', executor.run
+    )
+    return executor
+
+
+def store(recipe, future, source_name=None, ready=None):
+    calls = []
+
+    def called():
+        calls.append(True)
+        if ready is not None:
+            ready()
+
+    thumbnails._store(
+        Recipe, recipe.pk, source_name or recipe.image.name, called,
+        threading.get_ident(), future
+    )
+    recipe.refresh_from_db()
+    return bool(calls)
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'RGBA', 'P', 'L', 'CMYK'])
+def test_render_webp_fits_size(mode):
+    buffer = io.BytesIO()
+    Image.new(mode, (800, 400)).save(
+        buffer, 'JPEG' if mode == 'CMYK' else 'PNG'
+    )
+    with Image.open(io.BytesIO(render_webp(buffer.getvalue(), (320, 320),
+                                           80))) as image:
+        assert image.format == 'WEBP'
+        assert image.size == (320, 160)
+
+
+@pytest.mark.django_db
+def test_store_saves_thumbnail_of_current_original(recipe_with_image):
+    recipe = recipe_with_image
+    content = render_webp(image_data(), (320, 320), 80)
+    assert store(recipe, finished(content))
+    name = thumbnails.thumbnail_name(recipe.image.name)
+    assert recipe.image_small.name == name
+    with recipe.image_small.open('rb') as file:
+        assert file.read() == content
+
+
+@pytest.mark.django_db
+def test_store_skips_changed_original(recipe_with_image):
+    recipe = recipe_with_image
+    content = render_webp(image_data(), (320, 320), 80)
+    assert not store(recipe, finished(content),
+                     source_name='recipes/images/old.png')
+    assert recipe.image_small.name == ''
+
+
+@pytest.mark.django_db
+def test_store_survives_failed_render(recipe_with_image):
+    recipe = recipe_with_image
+    assert not store(recipe, finished(exception=OSError('битая картинка')))
+    assert recipe.image_small.name == ''
+
+
+@pytest.mark.django_db
+def test_thumbnail_field_falls_back_to_original(
+    client, recipe_with_image, committed
+):
+    recipe = recipe_with_image
+    url = f'/api/recipes/{recipe.id}/'
+    data = client.get(url).data
+    assert data['image_small'] == data['image']
+
+    with committed():
+        store(recipe, finished(render_webp(image_data(), (320, 320), 80)),
+              ready=lambda: recipes_changed([recipe.id]))
+    data = client.get(url).data
+    assert data['image_small'] != data['image']
+    assert data['image_small'].endswith(thumbnails.SUFFIX)
+
+
+@pytest.mark.django_db
+def test_make_thumbnails_bounds_queued_images(recipes, executor):
+    for index, recipe in enumerate(recipes):
+        recipe.image.save('image.png', ContentFile(image_data(
+            (index * 20, 0, 0)
+        )))
+    call_command('make_thumbnails', '--window', '3', stdout=io.StringIO())
+    assert executor.most_queued == 3
+    assert all(recipe.image_small.name.endswith(thumbnails.SUFFIX)
+               for recipe in Recipe.objects.all())
+
+
+@pytest.mark.django_db
+def test_avatar_change_invalidates_author_recipes(
+    client, author_client, recipes, committed
+):
+    recipe = recipes[0]
+    assert author_avatar(client, recipe) == ('MISS', None)
+    assert author_avatar(client, recipe) == ('HIT', None)
+
+    with committed():
+        author_client.put('/api/users/me/avatar/', {'avatar': image_uri()},
+                          format='json')
+    cache_status, avatar = author_avatar(client, recipe)
+    assert cache_status == 'MISS'
+    assert avatar is not None
+
+    with committed():
+        response = author_client.delete('/api/users/me/avatar/')
+    assert response.status_code == 204
+    assert author_avatar(client, recipe) == ('MISS', None)
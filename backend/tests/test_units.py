@@ -0,0 +1,78 @@
+import pytest
+from api.units import UnitTable, convert, normalize_unit
+
+# id не по порядку: таблица сама сортирует их для поиска.
+ROWS = [
+    (5, 'Молоко', 'ст. л.'),
+    (2, 'Мука', 'кг'),
+    (1, 'Мука', 'г'),
+    (4, 'Молоко', 'л'),
+    (3, 'Молоко', 'мл'),
+    (6, 'Соль', 'щепотка'),
+    (7, 'Соль', 'г'),
+    (8, 'Яйца', 'шт'),
+    (9, 'мука', 'г'),
+]
+
+
+@pytest.fixture
+def table():
+    return UnitTable('v1', iter(ROWS))
+
+
+@pytest.mark.parametrize('unit, expected', [
+    ('Ч.Л.', 'ч. л.'),
+    ('ст.л.', 'ст. л.'),
+    ('  Грамм ', 'г'),
+    ('шт', 'шт.'),
+    ('щепотка', 'щепотка'),
+])
+def test_normalize_unit(unit, expected):
+    assert normalize_unit(unit) == expected
+
+
+def test_unknown_unit_is_its_own_quantity():
+    assert convert('щепотка') == ('щепотка', 1)
+    assert convert('КГ') == ('масса', 1000)
+
+
+def test_merges_into_largest_unit_present(table):
+    assert table.aggregate([1, 2, 3, 4, 5], [500, 1.5, 250, 1, 2]) == [
+        ('Молоко', 'л', 1.28),
+        ('Мука', 'кг', 2),
+    ]
+
+
+def test_single_unit_stays_as_is(table):
+    assert table.aggregate([1, 3], [300, 150]) == [
+        ('Молоко', 'мл', 150),
+        ('Мука', 'г', 300),
+    ]
+
+
+def test_name_match_ignores_case(table):
+    assert table.aggregate([1, 9], [100, 50]) == [('Мука', 'г', 150)]
+
+
+def test_unknown_unit_stays_separate(table):
+    assert table.aggregate([6, 7, 8], [2, 5, 3]) == [
+        ('Соль', 'г', 5),
+        ('Соль', 'щепотка', 2),
+        ('Яйца', 'шт', 3),
+    ]
+
+
+def test_missing_ingredient_ids_are_skipped(table):
+    assert table.aggregate([0, 1, 100], [1, 10, 1]) == [('Мука', 'г', 10)]
+
+
+def test_rounds_to_two_decimals(table):
+    rows = table.aggregate([1, 2], [1, 1])
+    assert rows == [('Мука', 'кг', 1)]
+    assert table.aggregate([1, 2], [6, 1]) == [('Мука', 'кг', 1.01)]
+    assert table.aggregate([3], [1 / 3]) == [('Молоко', 'мл', 0.33)]
+
+
+def test_empty_cart_and_empty_table(table):
+    assert table.aggregate([], []) == []
+    assert UnitTable('v0', []).aggregate([1, 2], [1, 2]) == []
@@ -0,0 +1,70 @@
+import pytest
+from api.models import Favorite, Recipe, ShoppingCart
+from api.shopping_list import find_mismatches
+from rest_framework.test import APIClient
+
+from .conftest import create_recipe, create_user, run_concurrently
+
+THREADS = 8
+ENDPOINTS = [
+    ('favorite', Favorite, 'favorites_count'),
+    ('shopping_cart', ShoppingCart, 'cart_count'),
+]
+
+
+@pytest.fixture
+def recipe(transactional_db, tags, ingredients):
+    return create_recipe(create_user('author'), tags, ingredients)
+
+
+@pytest.fixture
+def reader(transactional_db):
+    return create_user('reader')
+
+
+def concurrent(reader, method, url):
+    def request(index):
+        client = APIClient()
+        client.force_authenticate(reader)
+        return getattr(client, method)(url).status_code
+
+    return sorted(run_concurrently(request, THREADS))
+
+
+@pytest.mark.parametrize('action, model, counter', ENDPOINTS)
+def test_concurrent_add_and_remove(reader, recipe, action, model, counter):
+    url = f'/api/recipes/{recipe.id}/{action}/'
+
+    assert concurrent(reader, 'post', url) == [201] + [400] * (THREADS - 1)
+    assert model.objects.filter(user=reader, recipe=recipe).count() == 1
+    assert getattr(Recipe.objects.get(id=recipe.id), counter) == 1
+    assert find_mismatches() == []
+
+    assert concurrent(reader, 'delete', url) == [204] + [400] * (THREADS - 1)
+    assert not model.objects.filter(user=reader, recipe=recipe).exists()
+    assert getattr(Recipe.objects.get(id=recipe.id), counter) == 0
+    assert find_mismatches() == []
+
+
+# Список покупок сначала блокирует рецепт, см. lock_recipes.
+@pytest.mark.parametrize('action, queries', [
+    ('favorite', 1), ('shopping_cart', 2),
+])
+def test_add_and_remove_queries(reader, recipe, action, queries,
+                                django_assert_num_queries):
+    client = APIClient()
+    client.force_authenticate(reader)
+    url = f'/api/recipes/{recipe.id}/{action}/'
+    with django_assert_num_queries(queries):
+        assert client.post(url).status_code == 201
+    with django_assert_num_queries(queries):
+        assert client.delete(url).status_code == 204
+
+
+@pytest.mark.django_db
+def test_missing_recipe_is_not_found(user_client):
+    for method in ('post', 'delete'):
+        response = getattr(user_client, method)(
+            '/api/recipes/1000000/favorite/'
+        )
+        assert response.status_code == 404
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_small',
+            field=models.ImageField(blank=True, editable=False, max_length=255, upload_to='', verbose_name='Миниатюра аватара'),
+        ),
+    ]
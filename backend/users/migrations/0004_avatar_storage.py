@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:18
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_avatar_small'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=api.storage.get_content_addressed_storage, upload_to='', verbose_name='Аватар'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from api.storage import get_content_addressed_storage
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.db import models
@@ -49,11 +50,19 @@ class User(AbstractUser):
         'Фамилия',
         max_length=150,
     )
-    avatar = models.ImageField('Аватар', blank=True, null=True)
+    avatar = models.ImageField('Аватар', blank=True, null=True,
+                               storage=get_content_addressed_storage)
+    avatar_small = models.ImageField('Миниатюра аватара', blank=True,
+                                     max_length=255, editable=False)
     role = models.CharField(
         'Права юзера',
         max_length=30, choices=CHOICES, default='user'
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
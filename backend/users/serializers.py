@@ -1,24 +1,13 @@
-import base64
-
-from django.core.files.base import ContentFile
+from api.fields import Base64ImageField, ThumbnailField
+from api.storage import release
 from rest_framework import serializers
 
 from .models import Follow, User
 
 
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
-
-
 class UserSerializer(serializers.ModelSerializer):
     avatar = Base64ImageField(required=False, allow_null=True)
+    avatar_small = ThumbnailField('avatar')
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -30,15 +19,26 @@ class UserSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'avatar',
+            'avatar_small',
             'is_subscribed'
         )
 
+    def update(self, instance, validated_data):
+        old_avatar = instance.avatar.name
+        instance = super().update(instance, validated_data)
+        if 'avatar' in validated_data:
+            release(old_avatar)
+        return instance
+
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get("request")
 
         return bool(
             request and request.user.is_authenticated
             and Follow.objects.filter(
+                following=obj,
                 user=self.context.get('request').user
             ).exists()
         )
@@ -50,3 +50,10 @@ class AvatarSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('avatar',)
+
+    def update(self, instance, validated_data):
+        old_avatar = instance.avatar.name
+        instance = super().update(instance, validated_data)
+        if 'avatar' in validated_data:
+            release(old_avatar)
+        return instance
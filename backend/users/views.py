@@ -1,6 +1,9 @@
 from http import HTTPStatus
 
-from api.serializers import FollowInfoSerializer, FollowSerializer
+from api.models import Recipe
+from api.serializers import (FollowInfoSerializer, FollowSerializer,
+                             get_recipes_limit)
+from django.db.models import Prefetch, Value, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from djoser import views
 from rest_framework.decorators import action
@@ -104,13 +107,20 @@ class UsersViewSet(views.UserViewSet):
         permission_classes=[IsAuthenticated, ]
     )
     def subscriptions(self, request):
-        user = request.user
-        queryset = User.objects.filter(
-            following__user=user
-        )
-        limit = self.paginate_queryset(queryset)
+        page = self.paginate_queryset(User.objects.filter(
+            following__user=request.user
+        ).annotate(is_subscribed=Value(True)))
+        # Рецепты подгружаются после пагинации: нумерация внутри автора
+        # идёт только по авторам этой страницы.
+        prefetch_related_objects(page, Prefetch(
+            'recipes',
+            queryset=Recipe.objects.filter(
+                author__in=page
+            ).first_per_author(get_recipes_limit(request)),
+            to_attr='limited_recipes'
+        ))
         serializer = FollowInfoSerializer(
-            limit,
+            page,
             many=True,
             context={"request": request}
         )